@@ -0,0 +1,51 @@
+"""association primary key and indexes
+
+Revision ID: 7069ee8d3ad1
+Revises: bf2fd1c9ee8d
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '7069ee8d3ad1'
+down_revision = 'bf2fd1c9ee8d'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # SQLite can not add a primary key to an existing table, so the table is copied,
+    # which also drops duplicate and incomplete memberships
+    op.create_table('association_new',
+                    sa.Column('chat_id', sa.BigInteger(), nullable=False),
+                    sa.Column('user_id', sa.BigInteger(), nullable=False),
+                    sa.ForeignKeyConstraint(['chat_id'], ['chats.id'], ),
+                    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+                    sa.PrimaryKeyConstraint('chat_id', 'user_id', name='pk_association')
+                    )
+    op.execute("INSERT INTO association_new (chat_id, user_id) "
+               "SELECT DISTINCT chat_id, user_id FROM association "
+               "WHERE chat_id IS NOT NULL AND user_id IS NOT NULL")
+    op.drop_table('association')
+    op.rename_table('association_new', 'association')
+
+    # the primary key covers lookups by chat, this one covers lookups by user
+    op.create_index(op.f('ix_association_user_id'), 'association', ['user_id'], unique=False)
+    op.create_index(op.f('ix_users_username'), 'users', ['username'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_users_username'), table_name='users')
+    op.drop_index(op.f('ix_association_user_id'), table_name='association')
+
+    op.create_table('association_old',
+                    sa.Column('chat_id', sa.BigInteger(), nullable=True),
+                    sa.Column('user_id', sa.BigInteger(), nullable=True),
+                    sa.ForeignKeyConstraint(['chat_id'], ['chats.id'], ),
+                    sa.ForeignKeyConstraint(['user_id'], ['users.id'], )
+                    )
+    op.execute("INSERT INTO association_old (chat_id, user_id) SELECT chat_id, user_id FROM association")
+    op.drop_table('association')
+    op.rename_table('association_old', 'association')
@@ -0,0 +1,99 @@
+#  Copyright (c) 2019 Markus Ressel
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU Affero General Public License as published
+#  by the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU Affero General Public License for more details.
+#
+#  You should have received a copy of the GNU Affero General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+Compares the lexicon fast path of the AdjectiveCounterIntelligenceRule with always parsing the message.
+
+Usage (from the repository root):
+    python -m benchmarks.adjective_lexicon
+"""
+
+from benchmarks import measure
+from deinemudda.response.lexicon import AdjectiveLexicon, ADJECTIVE_STOP_WORDS
+from deinemudda.response.nlp import find_adjp
+from tests.test_rule import RuleTest
+from tests.test_rule.test_negative_examples import NegativeExamplesTest
+
+CORPUS = RuleTest.real_examples + NegativeExamplesTest.real_examples + [
+    "das ist doch gut geworden",
+    "das ist doch sehr gut",
+    "der bot ist schlau",
+    "Ihr seid hässlich, dumm und doof",
+    "Das ist ja dumm",
+    "Du bist sehr schön",
+    "Du bist geil",
+    "Wer wohnt in ner Ananas ganz tief im Meer?",
+    "Irgendwer da?",
+    "Warum das denn?",
+    "Wessen auto ist das?",
+    "Wem gebe ich das?",
+    "ihr kacknasen",
+    "dei mudda",
+    "lol",
+    "ok",
+    "hahaha",
+    "bin gleich da",
+    "wer kommt heute mit?",
+    "was gibt's zu essen",
+]
+
+REPEAT = 20
+
+
+def matches(constituents) -> bool:
+    return len(constituents) > 0 and constituents[-1].lower() not in ADJECTIVE_STOP_WORDS
+
+
+def main():
+    lexicon = AdjectiveLexicon(ADJECTIVE_STOP_WORDS)
+
+    # load the tagger and lexicon before measuring
+    lexicon.may_match("warm up")
+    find_adjp("warm up")
+
+    skipped = 0
+    disagreements = []
+    for message in CORPUS:
+        if lexicon.may_match(message):
+            continue
+        skipped += 1
+        constituents = find_adjp(message)
+        if matches(constituents):
+            disagreements.append((message, constituents))
+
+    def parse_all():
+        for message in CORPUS:
+            find_adjp(message)
+
+    def fast_path_all():
+        for message in CORPUS:
+            if lexicon.may_match(message):
+                find_adjp(message)
+
+    parse_time = measure(parse_all, REPEAT) / len(CORPUS)
+    fast_path_time = measure(fast_path_all, REPEAT) / len(CORPUS)
+
+    print(f"messages:        {len(CORPUS)}")
+    print(f"skipped parsing: {skipped} ({skipped / len(CORPUS):.0%})")
+    print(f"disagreements:   {len(disagreements)}")
+    for message, constituents in disagreements:
+        print(f"  {message!r}: {constituents}")
+    print(f"always parse:    {parse_time * 1e6:.0f} µs/message")
+    print(f"fast path:       {fast_path_time * 1e6:.0f} µs/message")
+    print(f"speedup:         {parse_time / fast_path_time:.2f}x")
+
+
+if __name__ == '__main__':
+    main()
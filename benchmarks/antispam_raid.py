@@ -0,0 +1,100 @@
+#  Copyright (c) 2019 Markus Ressel
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU Affero General Public License as published
+#  by the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU Affero General Public License for more details.
+#
+#  You should have received a copy of the GNU Affero General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+Simulates a raid, where thousands of accounts send commands at the same time, and compares the memory usage
+and throughput of the message rate tracker with the previous tracker, which kept a list of datetimes per user
+and never removed users.
+
+Usage (from the repository root):
+    python -m benchmarks.antispam_raid
+"""
+
+import datetime
+import time
+import tracemalloc
+from unittest import mock
+
+from deinemudda.ratelimit import MessageRateTracker
+
+ACCOUNTS = 20000
+MESSAGES_PER_ACCOUNT = 10
+WINDOW = datetime.timedelta(seconds=30)
+MAX_MESSAGES = 5
+
+
+class LegacyTracker:
+    """
+    The previous implementation from AntiSpam
+    """
+
+    def __init__(self):
+        self.data = {}
+
+    def add(self, user_id: int) -> int:
+        latest_message_time = datetime.datetime.now()
+        old_elem = self.data.get(user_id, None)
+        message_times = [] if old_elem is None else old_elem["last_message_times"]
+        message_times = list(filter(lambda x: x > (latest_message_time - WINDOW), message_times))
+        message_times.append(latest_message_time)
+        self.data.update({user_id: {"last_message_times": message_times}})
+        return len(message_times)
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+
+def raid(tracker) -> float:
+    """
+    :return: messages per second
+    """
+    start = time.perf_counter()
+    for _ in range(MESSAGES_PER_ACCOUNT):
+        for user_id in range(ACCOUNTS):
+            tracker.add(user_id)
+    return ACCOUNTS * MESSAGES_PER_ACCOUNT / (time.perf_counter() - start)
+
+
+def measure_tracker(create) -> dict:
+    tracemalloc.start()
+    tracker = create()
+    baseline = tracemalloc.get_traced_memory()[0]
+    throughput = raid(tracker)
+    during = tracemalloc.get_traced_memory()[0] - baseline
+
+    # one message after the raid is over
+    later = time.monotonic() + WINDOW.total_seconds() + 1
+    with mock.patch("deinemudda.ratelimit.time.monotonic", lambda: later):
+        tracker.add(0)
+        after = tracemalloc.get_traced_memory()[0] - baseline
+        users_after = len(tracker)
+    tracemalloc.stop()
+    return dict(throughput=throughput, during=during, after=after, users_after=users_after)
+
+
+def main():
+    legacy = measure_tracker(LegacyTracker)
+    ring = measure_tracker(lambda: MessageRateTracker("benchmark", WINDOW.total_seconds(), MAX_MESSAGES))
+
+    print(f"{ACCOUNTS} accounts, {MESSAGES_PER_ACCOUNT} messages each")
+    print(f"{'tracker':<12}{'messages/s':>12}{'memory':>12}{'per user':>10}{'after window':>14}{'users':>8}")
+    for name, result in (("legacy", legacy), ("ring buffer", ring)):
+        print(f"{name:<12}{result['throughput']:>12.0f}{result['during'] / 1024 / 1024:>9.1f} MB"
+              f"{result['during'] / ACCOUNTS:>8.0f} B{result['after'] / 1024 / 1024:>11.1f} MB"
+              f"{result['users_after']:>8}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+#  Copyright (c) 2019 Markus Ressel
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU Affero General Public License as published
+#  by the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU Affero General Public License for more details.
+#
+#  You should have received a copy of the GNU Affero General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+Measures membership and username lookups on a database with 1M membership rows,
+before and after the migration that adds the association primary key and indexes.
+
+Usage (from the repository root):
+    python -m benchmarks.association_indexes
+"""
+
+import os
+import tempfile
+import time
+
+import alembic.command
+from alembic.config import Config
+from sqlalchemy import create_engine, text
+
+from benchmarks import measure
+from deinemudda.persistence import PROJECT_DIR
+
+CHATS = 10000
+USERS = 100000
+CHATS_PER_USER = 10
+REPEAT = 20
+
+QUERIES = {
+    "members of a chat": ("SELECT user_id FROM association WHERE chat_id = :chat_id", dict(chat_id=CHATS // 2)),
+    "chats of a user": ("SELECT chat_id FROM association WHERE user_id = :user_id", dict(user_id=USERS // 2)),
+    "membership exists": ("SELECT 1 FROM association WHERE chat_id = :chat_id AND user_id = :user_id",
+                          dict(chat_id=(USERS // 2) % CHATS, user_id=USERS // 2)),
+    "user by username": ("SELECT id FROM users WHERE username = :username", dict(username=f"user_{USERS // 2}")),
+}
+
+
+def migrate(url: str, revision: str):
+    config = Config(os.path.join(PROJECT_DIR, 'alembic.ini'))
+    config.set_main_option('script_location', os.path.join(PROJECT_DIR, 'alembic'))
+    config.set_main_option('sqlalchemy.url', url)
+    config.attributes['configure_logger'] = False
+    alembic.command.upgrade(config, revision)
+
+
+def fill(engine):
+    with engine.begin() as connection:
+        connection.execute(text("INSERT INTO chats (id, type) VALUES (:id, 'group')"),
+                           list(map(lambda x: dict(id=x), range(CHATS))))
+        connection.execute(text("INSERT INTO users (id, username, first_name) VALUES (:id, :username, 'user')"),
+                           list(map(lambda x: dict(id=x, username=f"user_{x}"), range(USERS))))
+        connection.execute(text("INSERT INTO association (chat_id, user_id) VALUES (:chat_id, :user_id)"), [
+            dict(chat_id=(user_id + i * (CHATS // CHATS_PER_USER)) % CHATS, user_id=user_id)
+            for user_id in range(USERS) for i in range(CHATS_PER_USER)
+        ])
+
+
+def measure_queries(engine) -> dict:
+    """
+    :return: query name -> average time in seconds
+    """
+    result = {}
+    with engine.connect() as connection:
+        for name, (query, params) in QUERIES.items():
+            statement = text(query)
+            result[name] = measure(lambda: connection.execute(statement, params).all(), REPEAT)
+    return result
+
+
+def main():
+    with tempfile.TemporaryDirectory() as directory:
+        url = f"sqlite:///{os.path.join(directory, 'benchmark.db')}"
+        migrate(url, 'bf2fd1c9ee8d')
+        engine = create_engine(url)
+        fill(engine)
+        before = measure_queries(engine)
+
+        start = time.perf_counter()
+        migrate(url, 'head')
+        migration_time = time.perf_counter() - start
+        after = measure_queries(engine)
+        engine.dispose()
+
+    print(f"{USERS * CHATS_PER_USER} memberships of {USERS} users in {CHATS} chats")
+    print(f"migration: {migration_time:.1f} s")
+    print(f"{'query':<20}{'before':>12}{'after':>12}")
+    for name in QUERIES.keys():
+        print(f"{name:<20}{before[name] * 1000:>9.3f} ms{after[name] * 1000:>9.3f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+#  Copyright (c) 2019 Markus Ressel
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU Affero General Public License as published
+#  by the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU Affero General Public License for more details.
+#
+#  You should have received a copy of the GNU Affero General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+Removes a chat with 10k members, of which every 10th is also a member of another chat.
+Compares the set based deletion of the persistence with finding orphans one user at a time.
+
+Usage (from the repository root):
+    python -m benchmarks.delete_chat
+"""
+
+import tempfile
+import time
+
+from sqlalchemy import event
+
+from benchmarks.sqlite_pragmas import create_config
+from deinemudda.persistence import Persistence, Chat
+from deinemudda.persistence.entity.user import User
+
+MEMBERS = 10000
+SHARED_EVERY = 10
+
+
+def fill(persistence: Persistence):
+    persistence.add_or_update_chat(Chat(id=1, type="group"))
+    persistence.add_or_update_chat(Chat(id=2, type="group"))
+    profiles = dict(map(lambda x: (x, ("user", f"user {x}", f"user_{x}")), range(MEMBERS)))
+    memberships = set(map(lambda x: (1, x), range(MEMBERS)))
+    memberships.update(map(lambda x: (2, x), range(0, MEMBERS, SHARED_EVERY)))
+    persistence._write_members(profiles, memberships)
+
+
+def delete_chat_per_user(persistence: Persistence, chat_id: int):
+    """
+    Deletes the chat and looks for orphans with one query per member
+    """
+    with persistence._session_scope(write=True) as session:
+        chat = session.query(Chat).get(chat_id)
+        users = list(chat.users)
+        session.delete(chat)
+        session.flush()
+        for user in users:
+            if session.query(Chat).filter(Chat.users.any(id=user.id)).first() is None:
+                session.delete(user)
+
+
+def measure(delete_func) -> tuple:
+    """
+    :return: duration in seconds, number of statements, remaining users
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        persistence = Persistence(create_config(directory, tuned=False))
+        try:
+            fill(persistence)
+            statements = []
+            event.listen(persistence._engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+
+            start = time.perf_counter()
+            delete_func(persistence)
+            duration = time.perf_counter() - start
+            statement_count = len(statements)
+
+            with persistence._session_scope() as session:
+                remaining = session.query(User).count()
+        finally:
+            persistence.close()
+    return duration, statement_count, remaining
+
+
+def main():
+    per_user = measure(lambda x: delete_chat_per_user(x, 1))
+    set_based = measure(lambda x: x.delete_chat(1))
+
+    print(f"members:   {MEMBERS}, {MEMBERS // SHARED_EVERY} of them also in another chat")
+    print(f"per user:  {per_user[0] * 1000:.0f} ms, {per_user[1]} statements, {per_user[2]} users left")
+    print(f"set based: {set_based[0] * 1000:.0f} ms, {set_based[1]} statements, {set_based[2]} users left")
+    print(f"speedup:   {per_user[0] / set_based[0]:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+#  Copyright (c) 2019 Markus Ressel
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU Affero General Public License as published
+#  by the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU Affero General Public License for more details.
+#
+#  You should have received a copy of the GNU Affero General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+Compares searching the pattern of every rule with only searching the patterns of the candidates
+found by the RuleMatcher.
+
+Usage (from the repository root):
+    python -m benchmarks.rule_matcher
+"""
+
+from benchmarks import measure
+from deinemudda.response import ResponseManager
+from deinemudda.response.matcher import RuleMatcher
+
+MESSAGES = {
+    "10 word miss": "ich bin heute abend erst später zuhause weil der zug ausfällt",
+    "long miss": " ".join(["das war ein langer tag im büro und jetzt gibt es endlich essen"] * 10),
+    "who question": "wer kommt heute abend mit ins kino?",
+    "adjective": "das ist doch geil",
+    "easter egg": "wer wohnt in ner ananas ganz tief im meer",
+}
+
+REPEAT = 20000
+
+
+def main():
+    rules = ResponseManager._find_rules()
+    pattern_rules = list(filter(lambda x: x.__pattern__ is not None, rules))
+    for rule in pattern_rules:
+        rule.warm_up()
+    matcher = RuleMatcher(rules)
+
+    def search_all(message: str):
+        return set(filter(lambda x: x.compiled_pattern.search(message) is not None, pattern_rules))
+
+    def search_candidates(message: str):
+        return set(filter(lambda x: x.compiled_pattern is not None and x.compiled_pattern.search(message) is not None,
+                          matcher.find_candidates(message)))
+
+    print(f"{len(pattern_rules)} rules with a pattern, {REPEAT} repetitions")
+    print(f"{'message':<16}{'search all':>14}{'matcher':>12}{'speedup':>10}")
+    for name, message in MESSAGES.items():
+        search_time = measure(lambda: search_all(message), REPEAT)
+        matcher_time = measure(lambda: search_candidates(message), REPEAT)
+        print(f"{name:<16}{search_time * 1e6:>11.1f} µs{matcher_time * 1e6:>9.1f} µs"
+              f"{search_time / matcher_time:>9.2f}x")
+
+
+if __name__ == '__main__':
+    main()
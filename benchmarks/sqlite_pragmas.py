@@ -0,0 +1,88 @@
+#  Copyright (c) 2019 Markus Ressel
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU Affero General Public License as published
+#  by the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU Affero General Public License for more details.
+#
+#  You should have received a copy of the GNU Affero General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+Compares the write throughput of the persistence with and without the tuned SQLite profile.
+Every member update is written in its own transaction, like it is done by the bot.
+
+Usage (from the repository root):
+    python -m benchmarks.sqlite_pragmas
+"""
+
+import datetime
+import os
+import tempfile
+import time
+from types import SimpleNamespace
+
+from deinemudda.persistence import Persistence, Chat
+
+CHATS = 10
+MEMBERS = 2000
+
+
+def create_config(directory: str, tuned: bool) -> SimpleNamespace:
+    return SimpleNamespace(
+        SQL_PERSISTENCE_URL=SimpleNamespace(value=f"sqlite:///{os.path.join(directory, 'benchmark.db')}"),
+        PERSISTENCE_CHAT_CACHE_SIZE=SimpleNamespace(value=CHATS),
+        PERSISTENCE_STATS_INTERVAL=SimpleNamespace(value=datetime.timedelta(hours=1)),
+        PERSISTENCE_WRITE_BEHIND=SimpleNamespace(value=False),
+        PERSISTENCE_FLUSH_INTERVAL=SimpleNamespace(value=datetime.timedelta(hours=1)),
+        PERSISTENCE_FLUSH_SIZE=SimpleNamespace(value=100),
+        PERSISTENCE_POOL_SIZE=SimpleNamespace(value=5),
+        PERSISTENCE_POOL_MAX_OVERFLOW=SimpleNamespace(value=10),
+        PERSISTENCE_POOL_PRE_PING=SimpleNamespace(value=False),
+        PERSISTENCE_POOL_RECYCLE=SimpleNamespace(value=datetime.timedelta(0)),
+        PERSISTENCE_SQLITE_TUNED=SimpleNamespace(value=tuned),
+        PERSISTENCE_AUTO_MIGRATE=SimpleNamespace(value=True),
+    )
+
+
+def measure_writes(tuned: bool) -> float:
+    """
+    :param tuned: whether to use the tuned SQLite profile
+    :return: written member updates per second
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        persistence = Persistence(create_config(directory, tuned))
+        try:
+            for chat_id in range(CHATS):
+                persistence.add_or_update_chat(Chat(id=chat_id, type="group"))
+            # only the writes are timed
+            chats = list(map(persistence.get_chat, range(CHATS)))
+            users = list(map(lambda x: SimpleNamespace(id=x, first_name="user", full_name=f"user {x}",
+                                                       username=f"user_{x}"), range(MEMBERS)))
+
+            start = time.perf_counter()
+            for user in users:
+                persistence.add_or_update_chat_member(chats[user.id % CHATS], user)
+            duration = time.perf_counter() - start
+        finally:
+            persistence.close()
+    return MEMBERS / duration
+
+
+def main():
+    default = measure_writes(tuned=False)
+    tuned = measure_writes(tuned=True)
+
+    print(f"member updates: {MEMBERS} in {CHATS} chats, one transaction each")
+    print(f"default:        {default:.0f} writes/s")
+    print(f"tuned:          {tuned:.0f} writes/s")
+    print(f"speedup:        {tuned / default:.2f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -14,45 +14,41 @@
 #  along with this program.  If not, see <https://www.gnu.org/licenses/>.
 import datetime
 import logging
-from typing import Dict
 
 from telegram import Update
 from telegram.ext import CallbackContext
 
 from deinemudda.config import AppConfig
-from deinemudda.const import SETTINGS_ANTISPAM_ENABLED_KEY, SETTINGS_ANTISPAM_ENABLED_DEFAULT
-from deinemudda.persistence import Persistence
+from deinemudda.persistence import DEFAULT_USER_STATE
+from deinemudda.persistence.async_persistence import AsyncPersistence
+from deinemudda.ratelimit import MessageRateTracker
 
 LOGGER = logging.getLogger(__name__)
 LOGGER.setLevel(logging.DEBUG)
 
-KEY_LAST_MESSAGE_TIMES = "last_message_times"
-KEY_HAS_BEEN_WARNED = "has_been_warned"
-
 
 class AntiSpam:
     """
     Keeps track of messages from users to decide if someone is spamming commands
     """
 
-    data: Dict[int, Dict] = {}
-
-    def __init__(self, config: AppConfig, persistence: Persistence):
+    def __init__(self, config: AppConfig, persistence: AsyncPersistence):
         self._config = config
         self._persistence = persistence
 
         self._user_timeout_duration = 30
         self._spam_time_window = datetime.timedelta(seconds=self._user_timeout_duration)
         self._spam_message_amount = 5
+        self._message_rate = MessageRateTracker("antispam", self._spam_time_window.total_seconds(),
+                                                self._spam_message_amount)
 
-    def _enabled(self, chat_id: int) -> bool:
-        chat = self._persistence.get_chat(chat_id)
-        if chat is None:
+    async def _enabled(self, chat_id: int) -> bool:
+        settings = await self._persistence.get_chat_settings(chat_id)
+        if settings is None:
             return False
-        anti_spam = chat.get_setting(SETTINGS_ANTISPAM_ENABLED_KEY, SETTINGS_ANTISPAM_ENABLED_DEFAULT)
-        return anti_spam == SETTINGS_ANTISPAM_ENABLED_DEFAULT
+        return settings.antispam_enabled
 
-    def process_message(self, update: Update, context: CallbackContext) -> bool:
+    async def process_message(self, update: Update, context: CallbackContext) -> bool:
         """
         Processes a message
         :param update: update
@@ -62,33 +58,35 @@ class AntiSpam:
         bot = context.bot
         chat_id = update.effective_message.chat_id
 
-        if not self._enabled(chat_id):
+        if not await self._enabled(chat_id):
             return False
 
         from_user = update.effective_message.from_user
-        self._update_data(from_user.id)
+        message_count = self._message_rate.add(from_user.id)
 
-        user_entity = self._persistence.get_user(from_user.id)
+        user_state = await self._persistence.get_user_state(from_user.id)
+        if user_state is None:
+            user_state = DEFAULT_USER_STATE
 
         # check if the user is banned
-        if user_entity.is_banned:
+        if user_state.is_banned:
             LOGGER.debug(f"Ignoring message from BANNED user {from_user.id}")
             return True
 
         # check if the user has a timeout
         now = datetime.datetime.now()
-        if user_entity.last_timeout is not None and user_entity.last_timeout >= now - datetime.timedelta(
+        if user_state.last_timeout is not None and user_state.last_timeout >= now - datetime.timedelta(
                 seconds=self._user_timeout_duration):
             LOGGER.debug(f"Ignoring message from TIMEOUTED user {from_user.id}")
             return True
 
         # check if the message is spam
-        is_spam = self._is_spam(update, context)
+        is_spam = message_count >= self._spam_message_amount
 
         if is_spam:
-            if user_entity.last_timeout is None or user_entity.last_timeout < now - datetime.timedelta(
+            if user_state.last_timeout is None or user_state.last_timeout < now - datetime.timedelta(
                     seconds=self._user_timeout_duration):
-                self.timeout_user(from_user.id)
+                await self.timeout_user(from_user.id)
                 LOGGER.debug(f"Timeouted user {from_user.id} for {self._user_timeout_duration} seconds")
             else:
                 try:
@@ -96,61 +94,23 @@ class AntiSpam:
                     LOGGER.debug(f"Kicked: {kicked}")
                 except Exception as ex:
                     LOGGER.debug(f"Error kicking user {from_user.id}: {ex}")
-                self.set_user_ban(from_user.id, True)
+                await self.set_user_ban(from_user.id, True)
                 LOGGER.debug(f"Banned user {from_user.id} because of excessive spam")
 
         return is_spam
 
-    def _is_spam(self, update: Update, context: CallbackContext) -> bool:
-        """
-        Checks if this message is spam
-        :param update: message update
-        :param context: callback context
-        :return: true if spam, false otherwise
-        """
-        from_user = update.effective_message.from_user
-
-        message_count = len(self.data[from_user.id][KEY_LAST_MESSAGE_TIMES])
-        if message_count >= self._spam_message_amount:
-            return True
-
-        return False
-
-    def timeout_user(self, user_id: int):
+    async def timeout_user(self, user_id: int):
         """
         Timeout a specific user
         :param user_id: the user id
         """
-        user_entity = self._persistence.get_user(user_id)
-        user_entity.last_timeout = datetime.datetime.now()
-        self._persistence.add_or_update_user(user_entity)
+        await self._persistence.set_user_timeout(user_id, datetime.datetime.now())
 
-    def set_user_ban(self, user_id: int, banned: bool):
+    async def set_user_ban(self, user_id: int, banned: bool):
         """
         Ban a specific user
         :param user_id: the user id
         :param banned: true is banned, false is unbanned
         """
-        user_entity = self._persistence.get_user(user_id)
-        user_entity.is_banned = banned
-        self._persistence.add_or_update_user(user_entity)
-
-    def _update_data(self, user_id: int) -> dict:
-        latest_message_time = datetime.datetime.now()
-        old_elem = self.data.get(user_id, None)
-        if old_elem is None:
-            message_times = []
-        else:
-            message_times = old_elem[KEY_LAST_MESSAGE_TIMES]
-
-        # remove message times outside interesting window
-        message_times = list(filter(lambda x: x > (latest_message_time - self._spam_time_window), message_times))
-        message_times.append(latest_message_time)
-
-        new_elem = {
-            user_id: {
-                KEY_LAST_MESSAGE_TIMES: message_times
-            }
-        }
-        self.data.update(new_elem)
-        return new_elem
+        await self._persistence.set_user_banned(user_id, banned)
+
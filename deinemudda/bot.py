@@ -28,9 +28,10 @@ from telegram_click.permission.base import Permission
 from deinemudda.antispam import AntiSpam
 from deinemudda.config import AppConfig
 from deinemudda.const import *
-from deinemudda.persistence import Persistence, Chat
+from deinemudda.persistence import Chat
+from deinemudda.persistence.async_persistence import AsyncPersistence
 from deinemudda.response import ResponseManager
-from deinemudda.stats import MESSAGE_TIME, MESSAGES_COUNT, format_metrics
+from deinemudda.stats import MESSAGE_TIME, format_metrics
 from deinemudda.util import send_message
 
 LOGGER = logging.getLogger(__name__)
@@ -52,13 +53,17 @@ CONFIG_ADMINS = _ConfigAdmins()
 
 class DeineMuddaBot:
 
-    def __init__(self, config: AppConfig, persistence: Persistence):
+    def __init__(self, config: AppConfig, persistence: AsyncPersistence, response_manager: ResponseManager = None):
         self._antispam = AntiSpam(config, persistence)
         self._config = config
         self._persistence = persistence
-        self._response_manager = ResponseManager(self._persistence)
+        if response_manager is None:
+            response_manager = ResponseManager(self._config, self._persistence)
+        self._response_manager = response_manager
 
-        self._app = ApplicationBuilder().token(self._config.TELEGRAM_BOT_TOKEN.value).build()
+        # updates are processed concurrently, so waiting for the database or NLP workers in one chat
+        # does not hold up the others (and concurrent NLP calls can be batched)
+        self._app = ApplicationBuilder().token(self._config.TELEGRAM_BOT_TOKEN.value).concurrent_updates(True).build()
 
         handler_groups = {
             0: [MessageHandler(filters=None, callback=self._any_message_callback)],
@@ -78,6 +83,10 @@ class DeineMuddaBot:
                     COMMAND_STATS,
                     filters=(~ filters.FORWARDED) & (~ filters.REPLY),
                     callback=self._stats_command_callback),
+                CommandHandler(
+                    COMMAND_RULES,
+                    filters=(~ filters.FORWARDED) & (~ filters.REPLY),
+                    callback=self._rules_command_callback),
                 CommandHandler(
                     COMMAND_MUDDA,
                     filters=(~ filters.FORWARDED),
@@ -131,6 +140,7 @@ class DeineMuddaBot:
         Shuts down the bot.
         """
         self._app.stop()
+        self._response_manager.shutdown()
 
     async def _shout(self, bot: Bot, message, text: str, reply: bool or int = True):
         """
@@ -160,18 +170,18 @@ class DeineMuddaBot:
         chat_id = update.effective_message.chat_id
         chat_type = update.effective_chat.type
 
-        chat = self._persistence.get_chat(chat_id)
+        chat = await self._persistence.get_chat(chat_id)
         from_user = update.effective_message.from_user
         if chat is None:
             # make sure we know about this chat in persistence
             chat = Chat(id=chat_id, type=chat_type)
             chat.set_setting(SETTINGS_ANTISPAM_ENABLED_KEY, SETTINGS_ANTISPAM_ENABLED_DEFAULT)
             chat.set_setting(SETTINGS_TRIGGER_PROBABILITY_KEY, SETTINGS_TRIGGER_PROBABILITY_DEFAULT)
-            self._persistence.add_or_update_chat(chat)
+            await self._persistence.add_or_update_chat(chat)
 
         # remember chat user
-        chat = self._persistence.get_chat(chat_id)
-        self._persistence.add_or_update_chat_member(chat, from_user)
+        chat = await self._persistence.get_chat(chat_id)
+        await self._persistence.add_or_update_chat_member(chat, from_user)
 
     @MESSAGE_TIME.time()
     async def _message_callback(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -179,20 +189,12 @@ class DeineMuddaBot:
         chat_id = update.effective_message.chat_id
 
         from_user = update.message.from_user
-        chat = self._persistence.get_chat(chat_id)
-
-        if len(update.message.text) not in self._config.CHAR_COUNT_RANGE.value:
-            return
 
-        if len(update.message.text.split()) not in self._config.WORD_COUNT_RANGE.value:
-            return
-
-        response_message = self._response_manager.find_matching_rule(chat, from_user.first_name, update.message.text)
+        response_message = await self._response_manager.process_message(chat_id, from_user.first_name,
+                                                                         update.message.text)
         if response_message:
             await self._shout(bot, update.message, response_message)
 
-        MESSAGES_COUNT.labels(chat_id=chat_id).inc()
-
     async def _group_message_callback(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         bot = context.bot
         effective_message = update.effective_message
@@ -207,23 +209,21 @@ class DeineMuddaBot:
                 if member.id == my_id:
                     LOGGER.debug(f"Bot was added to group: {chat_id}")
                     chat_entity = Chat(id=chat_id, type=chat_type)
-                    self._persistence.add_or_update_chat(chat_entity)
+                    await self._persistence.add_or_update_chat(chat_entity)
                 else:
                     LOGGER.debug(f"{member.full_name} ({member.id}) joined group {chat_id}")
-                    chat = self._persistence.get_chat(chat_id)
+                    chat = await self._persistence.get_chat(chat_id)
                     # remember chat user
-                    self._persistence.add_or_update_chat_member(chat, member)
+                    await self._persistence.add_or_update_chat_member(chat, member)
 
         if effective_message.left_chat_member:
             member = effective_message.left_chat_member
             if member.id == my_id:
                 LOGGER.debug(f"Bot was removed from group: {chat_id}")
-                self._persistence.delete_chat(chat_id)
+                await self._persistence.delete_chat(chat_id)
             else:
                 LOGGER.debug(f"{member.full_name} ({member.id}) left group {chat_id}")
-                chat = self._persistence.get_chat(chat_id)
-                chat.users = list(filter(lambda x: x.id != member.id, chat.users))
-                self._persistence.add_or_update_chat(chat)
+                await self._persistence.remove_chat_member(chat_id, member.id)
 
     @command(
         name=COMMAND_HELP,
@@ -283,6 +283,32 @@ class DeineMuddaBot:
 
         await send_message(bot, chat_id, text, reply_to=message_id)
 
+    @command(
+        name=COMMAND_RULES,
+        description="List response rules in the order they are evaluated.",
+        permissions=PRIVATE_CHAT & CONFIG_ADMINS
+    )
+    async def _rules_command_callback(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        """
+        /rules command handler
+        :param update: the chat update object
+        :param context: telegram context
+        """
+        bot = context.bot
+        message_id = update.effective_message.message_id
+        chat_id = update.effective_message.chat_id
+
+        rule_order = self._response_manager.rule_order
+        lines = []
+        for rule in rule_order.rules:
+            stats = rule_order.get_stats(rule)
+            cpu_time = "-" if stats.mean_cpu_time is None else f"{stats.mean_cpu_time * 1000:.3f}ms CPU"
+            lines.append(f"{rule.__priority__:g} {rule.__id__}: {stats.hits}/{stats.attempts} hits, {cpu_time}")
+
+        text = "\n".join(lines)
+        text = f"```\n{text}\n```"
+        await send_message(bot, chat_id, text, parse_mode="MARKDOWN", reply_to=message_id)
+
     @command(
         name=COMMAND_MUDDA,
         description="Trigger the bot manually.",
@@ -290,7 +316,7 @@ class DeineMuddaBot:
     )
     async def _mudda_command_callback(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         bot = context.bot
-        if self._antispam.process_message(update, context):
+        if await self._antispam.process_message(update, context):
             return
 
         text = "deine mudda"
@@ -320,10 +346,10 @@ class DeineMuddaBot:
         chat_id = update.effective_message.chat_id
         message_id = update.effective_message.message_id
 
-        chat = self._persistence.get_chat(chat_id)
+        chat = await self._persistence.get_chat(chat_id)
 
         lines = []
-        for setting in chat.settings:
+        for setting in chat.settings.values():
             lines.append(f"{setting.key}: {setting.value}")
 
         message = "\n".join(lines)
@@ -354,9 +380,10 @@ class DeineMuddaBot:
         chat_id = update.effective_message.chat_id
         message_id = update.effective_message.message_id
 
-        chat = self._persistence.get_chat(chat_id)
+        # the cached chat is shared with concurrently processed updates, so it is not modified
+        chat = Chat(id=chat_id, type=update.effective_chat.type)
         chat.set_setting(SETTINGS_TRIGGER_PROBABILITY_KEY, str(probability))
-        self._persistence.add_or_update_chat(chat)
+        await self._persistence.add_or_update_chat(chat)
 
         await send_message(bot, chat_id, message=f"TriggerChance: {probability * 100}%", reply_to=message_id)
 
@@ -377,9 +404,10 @@ class DeineMuddaBot:
         chat_id = update.effective_message.chat_id
         message_id = update.effective_message.message_id
 
-        chat = self._persistence.get_chat(chat_id)
+        # the cached chat is shared with concurrently processed updates, so it is not modified
+        chat = Chat(id=chat_id, type=update.effective_chat.type)
         chat.set_setting(SETTINGS_ANTISPAM_ENABLED_KEY, state)
-        self._persistence.add_or_update_chat(chat)
+        await self._persistence.add_or_update_chat(chat)
 
         await send_message(bot, chat_id, message=f"Antispam: {state}", reply_to=message_id)
 
@@ -393,9 +421,14 @@ class DeineMuddaBot:
         chat_id = update.effective_message.chat_id
         message_id = update.effective_message.message_id
 
-        chat = self._persistence.get_chat(chat_id)
-        message = "\n".join(
-            list(map(lambda x: f"{x.id}: {x.username}" + (" (BANNED)" if x.is_banned else ""), chat.users)))
+        chat = await self._persistence.get_chat(chat_id)
+        lines = []
+        for user in chat.users:
+            # the users of a cached chat do not reflect ban changes
+            user_state = await self._persistence.get_user_state(user.id)
+            is_banned = user_state is not None and user_state.is_banned
+            lines.append(f"{user.id}: {user.username}" + (" (BANNED)" if is_banned else ""))
+        message = "\n".join(lines)
 
         await send_message(bot, chat_id, message=message, reply_to=message_id)
 
@@ -419,9 +452,9 @@ class DeineMuddaBot:
 
         try:
             user_id = int(user)
-            user_entity = self._persistence.get_user(user_id)
+            user_entity = await self._persistence.get_user(user_id)
         except:
-            user_entity = self._persistence.get_user_by_username(user)
+            user_entity = await self._persistence.get_user_by_username(user)
 
         if user_entity is None:
             await send_message(bot, chat_id, message=f"User {user} is unknown", reply_to=message_id)
@@ -429,8 +462,7 @@ class DeineMuddaBot:
 
         user_id = user_entity.id
         username = user_entity.username
-        user_entity.is_banned = True
-        self._persistence.add_or_update_user(user_entity)
+        await self._antispam.set_user_ban(user_id, True)
 
         await send_message(bot, chat_id, message=f"Banned user: {username} ({user_id})",
                            reply_to=message_id)
@@ -455,9 +487,9 @@ class DeineMuddaBot:
 
         try:
             user_id = int(user)
-            user_entity = self._persistence.get_user(user_id)
+            user_entity = await self._persistence.get_user(user_id)
         except:
-            user_entity = self._persistence.get_user_by_username(user)
+            user_entity = await self._persistence.get_user_by_username(user)
 
         if user_entity is None:
             await send_message(bot, chat_id, message=f"User {user} is unknown", reply_to=message_id)
@@ -465,8 +497,7 @@ class DeineMuddaBot:
 
         user_id = user_entity.id
         username = user_entity.username
-        user_entity.is_banned = False
-        self._persistence.add_or_update_user(user_entity)
+        await self._antispam.set_user_ban(user_id, False)
 
         await send_message(bot, chat_id,
                            message=f"Unbanned user: {username} ({user_id})",
@@ -0,0 +1,137 @@
+#  Copyright (c) 2019 Markus Ressel
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU Affero General Public License as published
+#  by the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU Affero General Public License for more details.
+#
+#  You should have received a copy of the GNU Affero General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import datetime
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable
+
+from deinemudda.stats import CACHE_HITS_COUNT, CACHE_MISSES_COUNT, CACHE_EVICTIONS_COUNT, CACHE_SIZE
+
+
+class LruCache:
+    """
+    Thread safe key/value cache, bounded by the number of entries and (optionally) their age.
+    When full, the least recently used entry is evicted.
+    """
+
+    def __init__(self, name: str, max_size: int, ttl: datetime.timedelta or None = None):
+        """
+        :param name: name of this cache, used to label its metrics
+        :param max_size: maximum number of entries
+        :param ttl: maximum age of an entry, None to keep entries until they are evicted because of the size limit
+        """
+        self._name = name
+        self._max_size = max_size
+        self._ttl = None if ttl is None else ttl.total_seconds()
+        # key -> (insertion time, value)
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def resize(self, max_size: int, ttl: datetime.timedelta or None = None):
+        """
+        Changes the bounds of this cache, evicting entries if necessary
+        :param max_size: maximum number of entries
+        :param ttl: maximum age of an entry
+        """
+        with self._lock:
+            self._max_size = max_size
+            self._ttl = None if ttl is None else ttl.total_seconds()
+            self._evict()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """
+        :param key: the key
+        :param default: the value to return if there is no (valid) entry for the given key
+        :return: the cached value
+        """
+        with self._lock:
+            entry = self._entries.get(key, None)
+            if entry is not None and self._ttl is not None and entry[0] < time.monotonic() - self._ttl:
+                del self._entries[key]
+                CACHE_EVICTIONS_COUNT.labels(cache=self._name).inc()
+                CACHE_SIZE.labels(cache=self._name).set(len(self._entries))
+                entry = None
+
+            if entry is None:
+                CACHE_MISSES_COUNT.labels(cache=self._name).inc()
+                return default
+
+            self._entries.move_to_end(key)
+            CACHE_HITS_COUNT.labels(cache=self._name).inc()
+            return entry[1]
+
+    def __contains__(self, key: Hashable) -> bool:
+        """
+        Checks for a (valid) entry without counting it as a cache hit or miss
+        :param key: the key
+        :return: True if there is an entry for the given key
+        """
+        with self._lock:
+            entry = self._entries.get(key, None)
+            return entry is not None and (self._ttl is None or entry[0] >= time.monotonic() - self._ttl)
+
+    def set(self, key: Hashable, value: Any):
+        """
+        Adds or replaces an entry
+        :param key: the key
+        :param value: the value
+        """
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            self._evict()
+
+    def pop(self, key: Hashable):
+        """
+        Removes the entry with the given key, if any
+        :param key: the key
+        """
+        with self._lock:
+            self._entries.pop(key, None)
+            CACHE_SIZE.labels(cache=self._name).set(len(self._entries))
+
+    def clear(self):
+        """
+        Removes all entries
+        """
+        with self._lock:
+            self._entries.clear()
+            CACHE_SIZE.labels(cache=self._name).set(0)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _evict(self):
+        """
+        Removes the least recently used entries while they are expired or the size limit is exceeded.
+        Expired entries that have been used more recently are removed on access.
+        Must be called while holding the lock.
+        """
+        evicted = 0
+        if self._ttl is not None:
+            oldest_allowed = time.monotonic() - self._ttl
+            while len(self._entries) > 0 and next(iter(self._entries.values()))[0] < oldest_allowed:
+                self._entries.popitem(last=False)
+                evicted += 1
+
+        while len(self._entries) > self._max_size:
+            self._entries.popitem(last=False)
+            evicted += 1
+
+        if evicted > 0:
+            CACHE_EVICTIONS_COUNT.labels(cache=self._name).inc(evicted)
+        CACHE_SIZE.labels(cache=self._name).set(len(self._entries))
@@ -14,16 +14,26 @@
 #  along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
 from container_app_conf import ConfigBase
+from container_app_conf.entry.bool import BoolConfigEntry
 from container_app_conf.entry.int import IntConfigEntry
 from container_app_conf.entry.list import ListConfigEntry
 from container_app_conf.entry.range import RangeConfigEntry
 from container_app_conf.entry.string import StringConfigEntry
+from container_app_conf.entry.timedelta import TimeDeltaConfigEntry
 from container_app_conf.source.env_source import EnvSource
 from container_app_conf.source.yaml_source import YamlSource
 
 from deinemudda.const import CONFIG_NODE_ROOT, CONFIG_NODE_TELEGRAM, DEFAULT_SQL_PERSISTENCE_URL, \
     CONFIG_NODE_PERSISTENCE, CONFIG_NODE_STATS, CONFIG_NODE_PORT, CONFIG_NODE_BEHAVIOUR, CONFIG_NODE_WORD_COUNT_RANGE, \
-    CONFIG_NODE_CHAR_COUNT_RANGE
+    CONFIG_NODE_CHAR_COUNT_RANGE, CONFIG_NODE_NLP, CONFIG_NODE_CACHE_SIZE, CONFIG_NODE_CACHE_TTL, \
+    DEFAULT_NLP_CACHE_SIZE, DEFAULT_NLP_CACHE_TTL, CONFIG_NODE_WORKER_TYPE, CONFIG_NODE_WORKERS, \
+    CONFIG_NODE_QUEUE_SIZE, CONFIG_NODE_TIMEOUT, WORKER_TYPE_PROCESS, DEFAULT_NLP_TIMEOUT, CONFIG_NODE_BATCH_WINDOW, \
+    CONFIG_NODE_BATCH_SIZE, DEFAULT_NLP_BATCH_WINDOW, DEFAULT_NLP_BATCH_SIZE, CONFIG_NODE_RULE_ORDER_INTERVAL, \
+    DEFAULT_RULE_ORDER_INTERVAL, CONFIG_NODE_CHAT_CACHE_SIZE, DEFAULT_CHAT_CACHE_SIZE, CONFIG_NODE_STATS_INTERVAL, \
+    DEFAULT_STATS_INTERVAL, CONFIG_NODE_WRITE_BEHIND, CONFIG_NODE_FLUSH_INTERVAL, CONFIG_NODE_FLUSH_SIZE, \
+    DEFAULT_FLUSH_INTERVAL, DEFAULT_FLUSH_SIZE, CONFIG_NODE_POOL_SIZE, CONFIG_NODE_POOL_MAX_OVERFLOW, \
+    CONFIG_NODE_POOL_PRE_PING, CONFIG_NODE_POOL_RECYCLE, CONFIG_NODE_SQLITE_TUNED, DEFAULT_POOL_SIZE, \
+    DEFAULT_POOL_MAX_OVERFLOW, DEFAULT_POOL_RECYCLE, CONFIG_NODE_AUTO_MIGRATE
 
 
 class AppConfig(ConfigBase):
@@ -70,6 +80,105 @@ class AppConfig(ConfigBase):
         default=DEFAULT_SQL_PERSISTENCE_URL,
         secret=True)
 
+    PERSISTENCE_CHAT_CACHE_SIZE = IntConfigEntry(
+        key_path=[
+            CONFIG_NODE_ROOT,
+            CONFIG_NODE_PERSISTENCE,
+            CONFIG_NODE_CHAT_CACHE_SIZE
+        ],
+        default=DEFAULT_CHAT_CACHE_SIZE
+    )
+
+    PERSISTENCE_STATS_INTERVAL = TimeDeltaConfigEntry(
+        key_path=[
+            CONFIG_NODE_ROOT,
+            CONFIG_NODE_PERSISTENCE,
+            CONFIG_NODE_STATS_INTERVAL
+        ],
+        default=DEFAULT_STATS_INTERVAL
+    )
+
+    PERSISTENCE_WRITE_BEHIND = BoolConfigEntry(
+        key_path=[
+            CONFIG_NODE_ROOT,
+            CONFIG_NODE_PERSISTENCE,
+            CONFIG_NODE_WRITE_BEHIND
+        ],
+        default=False
+    )
+
+    PERSISTENCE_FLUSH_INTERVAL = TimeDeltaConfigEntry(
+        key_path=[
+            CONFIG_NODE_ROOT,
+            CONFIG_NODE_PERSISTENCE,
+            CONFIG_NODE_FLUSH_INTERVAL
+        ],
+        default=DEFAULT_FLUSH_INTERVAL
+    )
+
+    PERSISTENCE_FLUSH_SIZE = IntConfigEntry(
+        key_path=[
+            CONFIG_NODE_ROOT,
+            CONFIG_NODE_PERSISTENCE,
+            CONFIG_NODE_FLUSH_SIZE
+        ],
+        default=DEFAULT_FLUSH_SIZE
+    )
+
+    PERSISTENCE_POOL_SIZE = IntConfigEntry(
+        key_path=[
+            CONFIG_NODE_ROOT,
+            CONFIG_NODE_PERSISTENCE,
+            CONFIG_NODE_POOL_SIZE
+        ],
+        default=DEFAULT_POOL_SIZE
+    )
+
+    PERSISTENCE_POOL_MAX_OVERFLOW = IntConfigEntry(
+        key_path=[
+            CONFIG_NODE_ROOT,
+            CONFIG_NODE_PERSISTENCE,
+            CONFIG_NODE_POOL_MAX_OVERFLOW
+        ],
+        default=DEFAULT_POOL_MAX_OVERFLOW
+    )
+
+    PERSISTENCE_POOL_PRE_PING = BoolConfigEntry(
+        key_path=[
+            CONFIG_NODE_ROOT,
+            CONFIG_NODE_PERSISTENCE,
+            CONFIG_NODE_POOL_PRE_PING
+        ],
+        default=False
+    )
+
+    PERSISTENCE_POOL_RECYCLE = TimeDeltaConfigEntry(
+        key_path=[
+            CONFIG_NODE_ROOT,
+            CONFIG_NODE_PERSISTENCE,
+            CONFIG_NODE_POOL_RECYCLE
+        ],
+        default=DEFAULT_POOL_RECYCLE
+    )
+
+    PERSISTENCE_SQLITE_TUNED = BoolConfigEntry(
+        key_path=[
+            CONFIG_NODE_ROOT,
+            CONFIG_NODE_PERSISTENCE,
+            CONFIG_NODE_SQLITE_TUNED
+        ],
+        default=False
+    )
+
+    PERSISTENCE_AUTO_MIGRATE = BoolConfigEntry(
+        key_path=[
+            CONFIG_NODE_ROOT,
+            CONFIG_NODE_PERSISTENCE,
+            CONFIG_NODE_AUTO_MIGRATE
+        ],
+        default=True
+    )
+
     WORD_COUNT_RANGE = RangeConfigEntry(
         key_path=[
             CONFIG_NODE_ROOT,
@@ -88,6 +197,88 @@ class AppConfig(ConfigBase):
         default="[3..255]"
     )
 
+    RULE_ORDER_INTERVAL = TimeDeltaConfigEntry(
+        key_path=[
+            CONFIG_NODE_ROOT,
+            CONFIG_NODE_BEHAVIOUR,
+            CONFIG_NODE_RULE_ORDER_INTERVAL
+        ],
+        default=DEFAULT_RULE_ORDER_INTERVAL
+    )
+
+    NLP_CACHE_SIZE = IntConfigEntry(
+        key_path=[
+            CONFIG_NODE_ROOT,
+            CONFIG_NODE_NLP,
+            CONFIG_NODE_CACHE_SIZE
+        ],
+        default=DEFAULT_NLP_CACHE_SIZE
+    )
+
+    NLP_CACHE_TTL = TimeDeltaConfigEntry(
+        key_path=[
+            CONFIG_NODE_ROOT,
+            CONFIG_NODE_NLP,
+            CONFIG_NODE_CACHE_TTL
+        ],
+        default=DEFAULT_NLP_CACHE_TTL
+    )
+
+    NLP_WORKER_TYPE = StringConfigEntry(
+        key_path=[
+            CONFIG_NODE_ROOT,
+            CONFIG_NODE_NLP,
+            CONFIG_NODE_WORKER_TYPE
+        ],
+        default=WORKER_TYPE_PROCESS,
+        example="thread"
+    )
+
+    NLP_WORKERS = IntConfigEntry(
+        key_path=[
+            CONFIG_NODE_ROOT,
+            CONFIG_NODE_NLP,
+            CONFIG_NODE_WORKERS
+        ],
+        default=2
+    )
+
+    NLP_QUEUE_SIZE = IntConfigEntry(
+        key_path=[
+            CONFIG_NODE_ROOT,
+            CONFIG_NODE_NLP,
+            CONFIG_NODE_QUEUE_SIZE
+        ],
+        default=8
+    )
+
+    NLP_TIMEOUT = TimeDeltaConfigEntry(
+        key_path=[
+            CONFIG_NODE_ROOT,
+            CONFIG_NODE_NLP,
+            CONFIG_NODE_TIMEOUT
+        ],
+        default=DEFAULT_NLP_TIMEOUT
+    )
+
+    NLP_BATCH_WINDOW = TimeDeltaConfigEntry(
+        key_path=[
+            CONFIG_NODE_ROOT,
+            CONFIG_NODE_NLP,
+            CONFIG_NODE_BATCH_WINDOW
+        ],
+        default=DEFAULT_NLP_BATCH_WINDOW
+    )
+
+    NLP_BATCH_SIZE = IntConfigEntry(
+        key_path=[
+            CONFIG_NODE_ROOT,
+            CONFIG_NODE_NLP,
+            CONFIG_NODE_BATCH_SIZE
+        ],
+        default=DEFAULT_NLP_BATCH_SIZE
+    )
+
     STATS_PORT = IntConfigEntry(
         key_path=[
             CONFIG_NODE_ROOT,
@@ -13,6 +13,8 @@
 #  You should have received a copy of the GNU Affero General Public License
 #  along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
+import datetime
+
 DEINE_MUDDA_VERSION = "1.3.14"
 
 CONFIG_NODE_ROOT = "deinemudda"
@@ -21,18 +23,62 @@ CONFIG_NODE_TELEGRAM = "telegram"
 CONFIG_NODE_BEHAVIOUR = "behaviour"
 CONFIG_NODE_WORD_COUNT_RANGE = "word_count_range"
 CONFIG_NODE_CHAR_COUNT_RANGE = "char_count_range"
+CONFIG_NODE_RULE_ORDER_INTERVAL = "rule_order_interval"
 
 CONFIG_NODE_PERSISTENCE = "persistence"
+CONFIG_NODE_CHAT_CACHE_SIZE = "chat_cache_size"
+CONFIG_NODE_STATS_INTERVAL = "stats_interval"
+CONFIG_NODE_WRITE_BEHIND = "write_behind"
+CONFIG_NODE_FLUSH_INTERVAL = "flush_interval"
+CONFIG_NODE_FLUSH_SIZE = "flush_size"
+CONFIG_NODE_POOL_SIZE = "pool_size"
+CONFIG_NODE_POOL_MAX_OVERFLOW = "pool_max_overflow"
+CONFIG_NODE_POOL_PRE_PING = "pool_pre_ping"
+CONFIG_NODE_POOL_RECYCLE = "pool_recycle"
+CONFIG_NODE_SQLITE_TUNED = "sqlite_tuned"
+CONFIG_NODE_AUTO_MIGRATE = "auto_migrate"
+
+CONFIG_NODE_NLP = "nlp"
+CONFIG_NODE_CACHE_SIZE = "cache_size"
+CONFIG_NODE_CACHE_TTL = "cache_ttl"
+CONFIG_NODE_WORKER_TYPE = "worker_type"
+CONFIG_NODE_WORKERS = "workers"
+CONFIG_NODE_QUEUE_SIZE = "queue_size"
+CONFIG_NODE_TIMEOUT = "timeout"
+CONFIG_NODE_BATCH_WINDOW = "batch_window"
+CONFIG_NODE_BATCH_SIZE = "batch_size"
 
 CONFIG_NODE_STATS = "stats"
 CONFIG_NODE_PORT = "port"
 
 DEFAULT_SQL_PERSISTENCE_URL = "sqlite:///deinemudda.db"
+DEFAULT_CHAT_CACHE_SIZE = 1000
+DEFAULT_STATS_INTERVAL = datetime.timedelta(minutes=15)
+DEFAULT_FLUSH_INTERVAL = datetime.timedelta(milliseconds=500)
+DEFAULT_FLUSH_SIZE = 100
+DEFAULT_POOL_SIZE = 5
+DEFAULT_POOL_MAX_OVERFLOW = 10
+# zero disables recycling
+DEFAULT_POOL_RECYCLE = datetime.timedelta(0)
+
+DEFAULT_NLP_CACHE_SIZE = 10000
+DEFAULT_NLP_CACHE_TTL = datetime.timedelta(hours=1)
+DEFAULT_NLP_TIMEOUT = datetime.timedelta(seconds=2)
+DEFAULT_NLP_BATCH_WINDOW = datetime.timedelta(milliseconds=10)
+DEFAULT_NLP_BATCH_SIZE = 16
+
+CHAT_SETTINGS_CACHE_SIZE = 10000
+
+DEFAULT_RULE_ORDER_INTERVAL = datetime.timedelta(minutes=10)
+
+WORKER_TYPE_PROCESS = "process"
+WORKER_TYPE_THREAD = "thread"
 
 COMMAND_HELP = ['help', 'h']
 COMMAND_VERSION = ['version', 'v']
 COMMAND_CONFIG = ['config', 'c']
 COMMAND_STATS = 'stats'
+COMMAND_RULES = 'rules'
 COMMAND_MUDDA = 'mudda'
 
 COMMAND_LIST_USERS = ['users', 'u']
@@ -31,13 +31,51 @@ if __name__ == '__main__':
     from deinemudda.bot import DeineMuddaBot
     from deinemudda.config import AppConfig
     from deinemudda.persistence import Persistence
+    from deinemudda.persistence.async_persistence import AsyncPersistence
+    from deinemudda.response import ResponseManager
+    from deinemudda.stats import STARTUP_PHASE_TIME
 
-    config = AppConfig()
+    with STARTUP_PHASE_TIME.labels(phase="config").time():
+        config = AppConfig()
+
+    if sys.argv[1:] == ["migrate"]:
+        # one-shot schema migration, e.g. before starting a new version with auto_migrate disabled
+        Persistence.migrate(config.SQL_PERSISTENCE_URL.value)
+        sys.exit(0)
 
     # start prometheus server
     start_http_server(config.STATS_PORT.value)
 
-    persistence = Persistence(config)
-    bot = DeineMuddaBot(config, persistence)
+    with STARTUP_PHASE_TIME.labels(phase="persistence").time():
+        persistence = Persistence(config)
+        # database access from the bot must not block the event loop
+        async_persistence = AsyncPersistence(persistence)
+
+    # parse the settings of all chats, so the first message in a chat does not have to wait for them
+    with STARTUP_PHASE_TIME.labels(phase="settings").time():
+        persistence.preload_chat_settings()
+
+    # load banned and timeouted users, so antispam checks do not access the database
+    with STARTUP_PHASE_TIME.labels(phase="user_states").time():
+        persistence.preload_user_states()
+
+    # discover and instantiate rules
+    with STARTUP_PHASE_TIME.labels(phase="rules").time():
+        response_manager = ResponseManager(config, async_persistence)
+
+    # compile patterns, load the tagger and start the nlp workers
+    with STARTUP_PHASE_TIME.labels(phase="warm_up").time():
+        response_manager.warm_up()
+
+    with STARTUP_PHASE_TIME.labels(phase="bot").time():
+        bot = DeineMuddaBot(config, async_persistence, response_manager)
+
+    LOGGER.info("Startup complete: " + ", ".join(
+        map(lambda x: f"{x.labels['phase']}={x.value:.2f}s", STARTUP_PHASE_TIME.collect()[0].samples)))
 
     bot.start()
+
+    response_manager.shutdown()
+    async_persistence.shutdown()
+    # writes buffered changes
+    persistence.close()
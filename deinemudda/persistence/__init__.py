@@ -14,39 +14,191 @@
 #  along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
 import logging
+import os
+import threading
+import time
+import datetime
+from typing import Dict, Set, Tuple, NamedTuple
 
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, func, inspect, select, insert, update, delete, exists, text
+from sqlalchemy.engine import Engine, make_url
 from sqlalchemy.orm import sessionmaker, Session
+from sqlalchemy.pool import QueuePool
 from sqlalchemy.util.compat import contextmanager
 
+from deinemudda.cache import LruCache
 from deinemudda.config import AppConfig
-from deinemudda.persistence.entity.chat import Chat
+from deinemudda.const import CHAT_SETTINGS_CACHE_SIZE
+from deinemudda.persistence.entity.chat import Chat, Setting, association_table
 from deinemudda.persistence.entity.user import User
-from deinemudda.stats import ENTITIES_COUNT, USERS_IN_CHAT_COUNT
+from deinemudda.persistence.members import MemberNames
+from deinemudda.persistence.settings import ChatSettings
+from deinemudda.stats import ENTITIES_COUNT, USERS_IN_CHAT_COUNT, WRITE_BEHIND_FLUSH_SIZE, WRITE_BEHIND_FLUSH_TIME, \
+    WRITE_BEHIND_BUFFER_SIZE
 
 LOGGER = logging.getLogger(__name__)
 LOGGER.setLevel(logging.DEBUG)
 
+PROJECT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+
+# the latest alembic revision, must be updated with every new revision
+SCHEMA_REVISION = "7069ee8d3ad1"
+
+# applied to every new SQLite connection, if the tuned profile is enabled
+SQLITE_TUNED_PRAGMAS = {
+    # readers do not block the writer (and vice versa)
+    "journal_mode": "WAL",
+    # with WAL, this is still safe against corruption, but does not sync on every commit
+    "synchronous": "NORMAL",
+    "mmap_size": 256 * 1024 * 1024,
+    # negative values are in KiB
+    "cache_size": -64 * 1024,
+    # milliseconds to wait for a lock instead of failing immediately
+    "busy_timeout": 5000,
+}
+
+# maximum number of ids in a single bulk DELETE statement
+DELETE_BATCH_SIZE = 10000
+
+
+class SchemaOutdatedError(Exception):
+    pass
+
+
+class UserState(NamedTuple):
+    """
+    Antispam state of a user
+    """
+    is_banned: bool
+    last_timeout: datetime.datetime or None
+
+
+# state of users that have never been banned or timeouted
+DEFAULT_USER_STATE = UserState(is_banned=False, last_timeout=None)
+
 
 class Persistence:
 
     def __init__(self, config: AppConfig):
-        url = config.SQL_PERSISTENCE_URL.value
+        self._engine = self._create_engine(config)
+        if self.get_schema_revision(self._engine) != SCHEMA_REVISION:
+            if not config.PERSISTENCE_AUTO_MIGRATE.value:
+                self._engine.dispose()
+                raise SchemaOutdatedError("The database schema is outdated, run the migrate command first")
+            self.migrate(config.SQL_PERSISTENCE_URL.value)
+
+        # entities are used after their session is closed (and cached), so they must not be expired on commit
+        self._sessionmaker = sessionmaker(bind=self._engine, expire_on_commit=False)
+        # chat id -> chat, written through on every change of a chat
+        self._chat_cache = LruCache("chat", max_size=config.PERSISTENCE_CHAT_CACHE_SIZE.value)
+        # chat id -> user id -> profile fingerprint of members that are known to be up to date in the database
+        self._chat_members = LruCache("chat_members", max_size=config.PERSISTENCE_CHAT_CACHE_SIZE.value)
+        # chat id -> parsed settings, written through on every change of a chat
+        self._chat_settings = LruCache("chat_settings", max_size=CHAT_SETTINGS_CACHE_SIZE)
+        # chat id -> first names of all members, maintained incrementally once a chat has been loaded
+        self._member_names = LruCache("member_names", max_size=config.PERSISTENCE_CHAT_CACHE_SIZE.value)
+        # user id -> antispam state of all users that are banned or have been timeouted, written through on every
+        # change of a user, None until preloaded
+        self._user_states: Dict[int, UserState] or None = None
 
-        # TODO: this currently also logs to file because of alembic
-        self._migrate_db(url)
+        # stats are updated by every write, and periodically reconciled with the database to correct any drift
+        self._reconcile_stats()
+        self._stats_interval = config.PERSISTENCE_STATS_INTERVAL.value.total_seconds()
+        self._stop_event = threading.Event()
+        self._stats_thread = threading.Thread(target=self._reconcile_stats_periodically,
+                                              name="stats-reconciliation", daemon=True)
+        self._stats_thread.start()
 
-        self._engine = create_engine(url, echo=False)
-        self._sessionmaker = sessionmaker(bind=self._engine)
+        # buffered member changes, written by a background thread in write behind mode
+        self._write_behind = config.PERSISTENCE_WRITE_BEHIND.value
+        self._flush_interval = config.PERSISTENCE_FLUSH_INTERVAL.value.total_seconds()
+        self._flush_size = config.PERSISTENCE_FLUSH_SIZE.value
+        # user id -> profile fingerprint
+        self._pending_profiles: Dict[int, Tuple] = {}
+        # (chat id, user id)
+        self._pending_memberships: Set[Tuple[int, int]] = set()
+        self._buffer_lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._flush_event = threading.Event()
+        self._flush_thread = None
+        if self._write_behind:
+            self._flush_thread = threading.Thread(target=self._flush_periodically, name="write-behind", daemon=True)
+            self._flush_thread.start()
+
+    def close(self):
+        """
+        Stops background work, writes buffered changes and closes all database connections
+        """
+        self._stop_event.set()
+        self._flush_event.set()
+        self._stats_thread.join()
+        if self._flush_thread is not None:
+            self._flush_thread.join()
+        self.flush()
+        self._engine.dispose()
+
+    @staticmethod
+    def _create_engine(config: AppConfig) -> Engine:
+        """
+        Creates the database engine, with the pool settings and (for SQLite) the tuned profile from the config
+        :param config: the app config
+        :return: the engine
+        """
+        url = make_url(config.SQL_PERSISTENCE_URL.value)
+        recycle = config.PERSISTENCE_POOL_RECYCLE.value.total_seconds()
+        kwargs = dict(
+            pool_pre_ping=config.PERSISTENCE_POOL_PRE_PING.value,
+            pool_recycle=int(recycle) if recycle > 0 else -1,
+        )
+
+        is_sqlite = url.get_backend_name() == "sqlite"
+        # in-memory SQLite databases are bound to a single connection, so they keep their default pool
+        if not is_sqlite or url.database not in [None, "", ":memory:"]:
+            kwargs.update(pool_size=config.PERSISTENCE_POOL_SIZE.value,
+                          max_overflow=config.PERSISTENCE_POOL_MAX_OVERFLOW.value)
+            if is_sqlite:
+                # SQLite files are not pooled by default, connections are used by one thread at a time
+                kwargs.update(poolclass=QueuePool, connect_args=dict(check_same_thread=False))
+
+        engine = create_engine(url, echo=False, **kwargs)
+        if is_sqlite and config.PERSISTENCE_SQLITE_TUNED.value:
+            event.listen(engine, "connect", Persistence._apply_sqlite_pragmas)
+        return engine
+
+    @staticmethod
+    def _apply_sqlite_pragmas(connection, connection_record):
+        cursor = connection.cursor()
+        try:
+            for key, value in SQLITE_TUNED_PRAGMAS.items():
+                cursor.execute(f"PRAGMA {key}={value}")
+        finally:
+            cursor.close()
 
-        self._update_stats()
+    @staticmethod
+    def get_schema_revision(engine: Engine) -> str or None:
+        """
+        :param engine: the database engine
+        :return: the alembic revision of the database schema, or None if the database is empty
+        """
+        with engine.connect() as connection:
+            if not inspect(connection).has_table("alembic_version"):
+                return None
+            return connection.execute(text("SELECT version_num FROM alembic_version")).scalar()
 
     @staticmethod
-    def _migrate_db(url: str):
+    def migrate(url: str):
+        """
+        Migrates the database schema to the latest revision
+        :param url: the database url
+        """
+        # only imported when necessary, loading alembic and all revisions is slow
         from alembic.config import Config
         import alembic.command
 
-        config = Config('alembic.ini')
+        LOGGER.info("Migrating database schema")
+
+        config = Config(os.path.join(PROJECT_DIR, 'alembic.ini'))
+        config.set_main_option('script_location', os.path.join(PROJECT_DIR, 'alembic'))
         config.set_main_option('sqlalchemy.url', url)
         config.attributes['configure_logger'] = False
 
@@ -67,61 +219,508 @@ class Persistence:
             session.close()
 
     def get_chat(self, entity_id: int) -> Chat:
+        """
+        Chats are cached, so changes to the returned entity must be saved using
+        :func:`add_or_update_chat` (or discarded by calling :func:`get_chat` again).
+        :param entity_id: the chat id
+        :return: the chat, or None if it is unknown
+        """
+        chat = self._chat_cache.get(entity_id)
+        if chat is not None:
+            return chat
+
+        with self._session_scope() as session:
+            chat = session.query(Chat).get(entity_id)
+        if chat is not None:
+            self._chat_cache.set(entity_id, chat)
+            self._cache_member_names(chat)
+        return chat
+
+    def sample_member_name(self, chat_id: int) -> str or None:
+        """
+        Selects a random member of a chat, without loading all of its members.
+        :param chat_id: the chat id
+        :return: the first name of a random member, or None if no member is known
+        """
+        name = self._sample_cached_member_name(chat_id)
+        if name is not None:
+            return name
+
+        users_table = User.__table__
+        with self._session_scope() as session:
+            return session.execute(
+                select(users_table.c.first_name).join(
+                    association_table, users_table.c.id == association_table.c.user_id).where(
+                    association_table.c.chat_id == chat_id).order_by(func.random()).limit(1)).scalar()
+
+    def sample_cached_member_name(self, chat_id: int) -> str or None:
+        """
+        Does not access the database. A miss is not counted, so it can be followed by :func:`sample_member_name`.
+        :param chat_id: the chat id
+        :return: the first name of a random member, or None if the members of the chat are not cached
+        """
+        if chat_id not in self._member_names:
+            return None
+        return self._sample_cached_member_name(chat_id)
+
+    def _sample_cached_member_name(self, chat_id: int) -> str or None:
+        names = self._member_names.get(chat_id)
+        if names is None:
+            return None
+        return names.sample()
+
+    def _cache_member_names(self, chat: Chat):
+        self._member_names.set(chat.id, MemberNames(dict(map(lambda x: (x.id, x.first_name), chat.users))))
+
+    def get_chat_settings(self, chat_id: int) -> ChatSettings or None:
+        """
+        Only loads the settings of the chat, if they are not cached
+        :param chat_id: the chat id
+        :return: the settings, or None if the chat is unknown
+        """
+        settings = self._get_cached_chat_settings(chat_id)
+        if settings is not None:
+            return settings
+
+        chats_table = Chat.__table__
+        settings_table = Setting.__table__
+        with self._session_scope() as session:
+            rows = session.execute(
+                select(chats_table.c.id, settings_table.c.key, settings_table.c.value).outerjoin(
+                    settings_table, chats_table.c.id == settings_table.c.chat_id).where(
+                    chats_table.c.id == chat_id)).all()
+        if len(rows) <= 0:
+            return None
+        settings = ChatSettings(dict(map(lambda x: (x.key, x.value), filter(lambda x: x.key is not None, rows))))
+        self._chat_settings.set(chat_id, settings)
+        return settings
+
+    def get_cached_chat_settings(self, chat_id: int) -> ChatSettings or None:
+        """
+        Does not access the database. A miss is not counted, so it can be followed by :func:`get_chat_settings`.
+        :param chat_id: the chat id
+        :return: the cached settings, or None if they are not cached
+        """
+        if chat_id not in self._chat_settings and chat_id not in self._chat_cache:
+            return None
+        return self._get_cached_chat_settings(chat_id)
+
+    def _get_cached_chat_settings(self, chat_id: int) -> ChatSettings or None:
+        settings = self._chat_settings.get(chat_id)
+        if settings is None:
+            chat = self._chat_cache.get(chat_id)
+            if chat is not None:
+                settings = self._cache_chat_settings(chat)
+        return settings
+
+    def preload_chat_settings(self) -> int:
+        """
+        Loads the settings of all chats into the cache, using a single query
+        :return: number of chats whose settings have been loaded
+        """
+        chats_table = Chat.__table__
+        settings_table = Setting.__table__
+        with self._session_scope() as session:
+            rows = session.execute(
+                select(chats_table.c.id, settings_table.c.key, settings_table.c.value).outerjoin(
+                    settings_table, chats_table.c.id == settings_table.c.chat_id)).all()
+
+        values: Dict[int, Dict[str, str]] = {}
+        for chat_id, key, value in rows:
+            chat_values = values.setdefault(chat_id, {})
+            if key is not None:
+                chat_values[key] = value
+        for chat_id, chat_values in values.items():
+            self._chat_settings.set(chat_id, ChatSettings(chat_values))
+        return len(values)
+
+    def _cache_chat_settings(self, chat: Chat) -> ChatSettings:
+        settings = ChatSettings(dict(map(lambda x: (x.key, x.value), chat.settings.values())))
+        self._chat_settings.set(chat.id, settings)
+        return settings
+
+    def get_member_count(self, chat_id: int) -> int:
+        """
+        :param chat_id: the chat id
+        :return: number of known users in the given chat
+        """
+        self.flush()
         with self._session_scope() as session:
-            return session.query(Chat).get(entity_id)
+            return session.execute(select(func.count()).select_from(association_table).where(
+                association_table.c.chat_id == chat_id)).scalar()
+
+    def get_cached_chat(self, entity_id: int) -> Chat or None:
+        """
+        Does not access the database. A miss is not counted, so it can be followed by :func:`get_chat`.
+        :param entity_id: the chat id
+        :return: the cached chat, or None if it is not cached
+        """
+        if entity_id not in self._chat_cache:
+            return None
+        return self._chat_cache.get(entity_id)
 
     def add_or_update_chat(self, chat: Chat) -> None:
-        with self._session_scope(write=True) as session:
-            session.merge(chat)
-        self._update_stats()
+        """
+        Adds a chat with its settings and members, or updates the type and settings of an existing chat.
+        The members of an existing chat are not changed, use :func:`add_or_update_chat_member`
+        and :func:`remove_chat_member` for that.
+        :param chat: the chat
+        """
+        # the cached chat does not contain buffered members, so they are written and loaded again
+        self.flush()
+        try:
+            with self._session_scope(write=True) as session:
+                existing = session.query(Chat).get(chat.id)
+                is_new_chat = existing is None
+                if is_new_chat:
+                    chat = session.merge(chat)
+                    new_user_count = len(list(filter(lambda x: isinstance(x, User), session.new)))
+                else:
+                    existing.type = chat.type
+                    for key, setting in chat.settings.items():
+                        existing.set_setting(key, setting.value)
+                    chat = existing
+                    new_user_count = 0
+                session.flush()
+                # load everything the cached entity may be used for, while we still have a session
+                chat.users
+                chat.settings
+        except:
+            self._chat_cache.pop(chat.id)
+            self._chat_settings.pop(chat.id)
+            self._member_names.pop(chat.id)
+            raise
+        self._chat_cache.set(chat.id, chat)
+        self._cache_chat_settings(chat)
+        # the members of an existing chat are not changed, its names are maintained incrementally
+        if is_new_chat or chat.id not in self._member_names:
+            self._cache_member_names(chat)
+
+        if is_new_chat:
+            ENTITIES_COUNT.labels(type='chat').inc()
+        if new_user_count > 0:
+            ENTITIES_COUNT.labels(type='user').inc(new_user_count)
+        USERS_IN_CHAT_COUNT.labels(chat_id=chat.id).set(len(chat.users))
 
     def add_or_update_chat_member(self, chat: Chat, user: User) -> None:
-        user_entity = User(
-            id=user.id,
-            first_name=user.first_name,
-            full_name=user.full_name,
-            username=user.username
-        )
-        # remove old data
-        chat.users = list(filter(lambda x: x.id != user_entity.id, chat.users))
-        # add new
-        chat.users.append(user_entity)
-        # save
-        self.add_or_update_chat(chat)
+        """
+        Makes sure the given user is a member of the given chat and its profile is up to date.
+        Does nothing if this was already done for the same profile data.
+        In write behind mode, the change is buffered and written by a background thread.
+        :param chat: the chat
+        :param user: the (telegram) user
+        """
+        if self.is_known_chat_member(chat, user):
+            return
+        fingerprint = self._fingerprint(user)
+        members = self._chat_members.get(chat.id)
+
+        if self._write_behind:
+            with self._buffer_lock:
+                self._pending_profiles[user.id] = fingerprint
+                self._pending_memberships.add((chat.id, user.id))
+                buffer_size = len(self._pending_memberships)
+            WRITE_BEHIND_BUFFER_SIZE.set(buffer_size)
+            if buffer_size >= self._flush_size:
+                self._flush_event.set()
+        else:
+            self._write_members({user.id: fingerprint}, {(chat.id, user.id)})
+
+        if members is None:
+            members = {}
+            self._chat_members.set(chat.id, members)
+        members[user.id] = fingerprint
+        names = self._member_names.get(chat.id)
+        if names is not None:
+            names.set(user.id, user.first_name)
+
+    def remove_chat_member(self, chat_id: int, user_id: int) -> None:
+        """
+        Removes a user from the members of a chat, the user itself is kept
+        :param chat_id: the chat id
+        :param user_id: the user id
+        """
+        # a buffered membership must not be written after (and undo) this change
+        self.flush()
+        with self._session_scope(write=True) as session:
+            removed = session.execute(delete(association_table).where(
+                association_table.c.chat_id == chat_id, association_table.c.user_id == user_id)).rowcount
+
+        chat = self._chat_cache.get(chat_id)
+        if chat is not None:
+            chat.users = list(filter(lambda x: x.id != user_id, chat.users))
+        members = self._chat_members.get(chat_id)
+        if members is not None:
+            members.pop(user_id, None)
+        names = self._member_names.get(chat_id)
+        if names is not None:
+            names.remove(user_id)
+
+        if removed > 0:
+            USERS_IN_CHAT_COUNT.labels(chat_id=chat_id).dec(removed)
+
+    def is_known_chat_member(self, chat: Chat, user: User) -> bool:
+        """
+        Does not access the database.
+        :param chat: the chat
+        :param user: the (telegram) user
+        :return: True if the user is known to be a member of the chat, with the same profile data
+        """
+        members = self._chat_members.get(chat.id)
+        return members is not None and members.get(user.id, None) == self._fingerprint(user)
+
+    @staticmethod
+    def _fingerprint(user: User) -> Tuple:
+        return user.first_name, user.full_name, user.username
+
+    def flush(self):
+        """
+        Writes all buffered changes to the database (in write behind mode)
+        """
+        with self._flush_lock:
+            with self._buffer_lock:
+                profiles, memberships = self._pending_profiles, self._pending_memberships
+                self._pending_profiles, self._pending_memberships = {}, set()
+            WRITE_BEHIND_BUFFER_SIZE.set(0)
+            if len(memberships) <= 0:
+                return
+
+            start = time.perf_counter()
+            try:
+                self._write_members(profiles, memberships)
+            except:
+                # make sure the next message of these members is written again
+                for chat_id, _ in memberships:
+                    self._chat_members.pop(chat_id)
+                raise
+            WRITE_BEHIND_FLUSH_TIME.observe(time.perf_counter() - start)
+            WRITE_BEHIND_FLUSH_SIZE.observe(len(memberships))
+
+    def _flush_periodically(self):
+        while not self._stop_event.is_set():
+            self._flush_event.wait(self._flush_interval)
+            self._flush_event.clear()
+            try:
+                self.flush()
+            except Exception as ex:
+                LOGGER.exception(ex)
+
+    def _write_members(self, profiles: Dict[int, Tuple], memberships: Set[Tuple[int, int]]):
+        """
+        Writes user profiles and chat memberships using targeted statements, in a single transaction
+        :param profiles: user id -> (first name, full name, username)
+        :param memberships: (chat id, user id) pairs
+        """
+        users_table = User.__table__
+        with self._session_scope(write=True) as session:
+            stored = dict(map(lambda x: (x[0], tuple(x[1:])), session.execute(
+                select(users_table.c.id, users_table.c.first_name, users_table.c.full_name,
+                       users_table.c.username).where(users_table.c.id.in_(profiles.keys())))))
+            new_users = list(filter(lambda x: x not in stored, profiles.keys()))
+            changed_users = list(filter(lambda x: x in stored and stored[x] != profiles[x], profiles.keys()))
+
+            if len(new_users) > 0:
+                session.execute(insert(users_table),
+                                list(map(lambda x: self._profile_values(x, profiles[x]), new_users)))
+            for user_id in changed_users:
+                session.execute(update(users_table).where(users_table.c.id == user_id).values(
+                    self._profile_values(user_id, profiles[user_id])))
+            # all chats that contain a changed user, not only the ones it has written to now
+            changed_memberships = set(filter(lambda x: x[1] in changed_users, memberships))
+            if len(changed_users) > 0:
+                changed_memberships.update(map(tuple, session.execute(
+                    select(association_table.c.chat_id, association_table.c.user_id).where(
+                        association_table.c.user_id.in_(changed_users)))))
+
+            existing_memberships = set(map(tuple, session.execute(
+                select(association_table.c.chat_id, association_table.c.user_id).where(
+                    association_table.c.chat_id.in_(set(map(lambda x: x[0], memberships))),
+                    association_table.c.user_id.in_(set(map(lambda x: x[1], memberships)))))))
+            new_memberships = memberships - existing_memberships
+            if len(new_memberships) > 0:
+                session.execute(insert(association_table), list(
+                    map(lambda x: dict(chat_id=x[0], user_id=x[1]), new_memberships)))
+
+        for chat_id, user_id in changed_memberships:
+            # cached chats contain the old version of these users
+            self._chat_cache.pop(chat_id)
+            names = self._member_names.get(chat_id)
+            if names is not None:
+                names.set(user_id, profiles[user_id][0])
+        for chat_id, user_id in new_memberships:
+            chat = self._chat_cache.get(chat_id)
+            # the chat may have been loaded after the membership was written
+            if chat is not None and not any(map(lambda x: x.id == user_id, chat.users)):
+                first_name, full_name, username = profiles[user_id]
+                chat.users.append(User(id=user_id, first_name=first_name, full_name=full_name, username=username))
+
+        if len(new_users) > 0:
+            ENTITIES_COUNT.labels(type='user').inc(len(new_users))
+        for chat_id, _ in new_memberships:
+            USERS_IN_CHAT_COUNT.labels(chat_id=chat_id).inc()
+
+    @staticmethod
+    def _profile_values(user_id: int, profile: Tuple) -> dict:
+        first_name, full_name, username = profile
+        return dict(id=user_id, first_name=first_name, full_name=full_name, username=username)
 
     def delete_chat(self, entity_id: int) -> None:
+        """
+        Deletes a chat with its settings and memberships, as well as all of its members that are not a member
+        of any other chat, using a constant number of statements (for chats with up to DELETE_BATCH_SIZE members)
+        :param entity_id: the chat id
+        """
+        self.flush()
+        chats_table = Chat.__table__
+        users_table = User.__table__
+        settings_table = Setting.__table__
+        other_memberships = association_table.alias()
         with self._session_scope(write=True) as session:
-            chat = session.query(Chat).filter_by(id=entity_id).first()
-            session.query(Chat).filter_by(id=entity_id).delete()
-            if chat is not None:
-                # delete orphans (users without any chat)
-                for user in chat.users:
-                    chat = session.query(Chat, User).filter(Chat.users.any(id=user.id)).first()
-                    if chat is None:
-                        user.delete()
-        self._update_stats()
+            # members of this chat that are not a member of any other chat, users without any membership
+            # that are not related to this chat (e.g. banned users that left) are kept
+            orphans = session.execute(select(association_table.c.user_id).where(
+                association_table.c.chat_id == entity_id,
+                ~exists().where(other_memberships.c.user_id == association_table.c.user_id,
+                                other_memberships.c.chat_id != entity_id))).scalars().all()
+            session.execute(delete(association_table).where(association_table.c.chat_id == entity_id))
+            session.execute(delete(settings_table).where(settings_table.c.chat_id == entity_id))
+            deleted_chats = session.execute(delete(chats_table).where(chats_table.c.id == entity_id)).rowcount
+            deleted_users = 0
+            # keeps the number of bound parameters below the limit of the database
+            for start in range(0, len(orphans), DELETE_BATCH_SIZE):
+                deleted_users += session.execute(delete(users_table).where(
+                    users_table.c.id.in_(orphans[start:start + DELETE_BATCH_SIZE]))).rowcount
+        self._chat_cache.pop(entity_id)
+        self._chat_members.pop(entity_id)
+        self._chat_settings.pop(entity_id)
+        self._member_names.pop(entity_id)
+        if self._user_states is not None:
+            for user_id in orphans:
+                self._user_states.pop(user_id, None)
+
+        if deleted_chats > 0:
+            ENTITIES_COUNT.labels(type='chat').dec(deleted_chats)
+        if deleted_users > 0:
+            ENTITIES_COUNT.labels(type='user').dec(deleted_users)
+        try:
+            USERS_IN_CHAT_COUNT.remove(entity_id)
+        except KeyError:
+            pass
 
     def get_user(self, entity_id: int) -> User:
+        self.flush()
         with self._session_scope() as session:
             return session.query(User).get(entity_id)
 
     def get_user_by_username(self, username: str) -> User or None:
+        self.flush()
         with self._session_scope() as session:
             return session.query(User).filter_by(username=username).one_or_none()
 
+    def get_user_state(self, user_id: int) -> UserState or None:
+        """
+        Only loads the antispam state of a user
+        :param user_id: the user id
+        :return: the state, or None if the user is unknown
+        """
+        users_table = User.__table__
+        with self._session_scope() as session:
+            row = session.execute(select(users_table.c.is_banned, users_table.c.last_timeout).where(
+                users_table.c.id == user_id)).one_or_none()
+        if row is None:
+            return None
+        return UserState(is_banned=bool(row.is_banned), last_timeout=row.last_timeout)
+
+    def get_cached_user_state(self, user_id: int) -> UserState or None:
+        """
+        Does not access the database.
+        :param user_id: the user id
+        :return: the state, or None if the states have not been preloaded
+        """
+        if self._user_states is None:
+            return None
+        return self._user_states.get(user_id, DEFAULT_USER_STATE)
+
+    def preload_user_states(self) -> int:
+        """
+        Loads the antispam state of all users that are banned or have been timeouted, using a single query.
+        Afterwards, the state of every user is available without accessing the database.
+        :return: number of loaded states
+        """
+        users_table = User.__table__
+        with self._session_scope() as session:
+            rows = session.execute(select(users_table.c.id, users_table.c.is_banned, users_table.c.last_timeout).where(
+                users_table.c.is_banned | users_table.c.last_timeout.isnot(None))).all()
+        self._user_states = dict(map(
+            lambda x: (x.id, UserState(is_banned=bool(x.is_banned), last_timeout=x.last_timeout)), rows))
+        return len(self._user_states)
+
+    def _cache_user_state(self, user_id: int, state: UserState):
+        if self._user_states is None:
+            return
+        if state == DEFAULT_USER_STATE:
+            self._user_states.pop(user_id, None)
+        else:
+            self._user_states[user_id] = state
+
+    def set_user_banned(self, user_id: int, banned: bool) -> None:
+        """
+        :param user_id: the user id
+        :param banned: true is banned, false is unbanned
+        """
+        self._update_user_state(user_id, is_banned=banned)
+
+    def set_user_timeout(self, user_id: int, timeout: datetime.datetime) -> None:
+        """
+        :param user_id: the user id
+        :param timeout: start of the timeout
+        """
+        self._update_user_state(user_id, last_timeout=timeout)
+
+    def _update_user_state(self, user_id: int, **values):
+        # the user may only be known from the write behind buffer
+        self.flush()
+        users_table = User.__table__
+        with self._session_scope(write=True) as session:
+            updated = session.execute(update(users_table).where(users_table.c.id == user_id).values(**values)).rowcount
+        # cached chats are kept (a timeout must not evict all of them during a raid), so the users they contain
+        # have an outdated antispam state, which is read from the user state index instead
+        if updated > 0 and self._user_states is not None:
+            self._cache_user_state(user_id, self._user_states.get(user_id, DEFAULT_USER_STATE)._replace(**values))
+
     def add_or_update_user(self, user: User) -> None:
+        self.flush()
+        is_new_user = inspect(user).transient
         with self._session_scope(write=True) as session:
             session.add(user)
-        self._update_stats()
+        # cached chats contain the old version of this user
+        self._chat_cache.clear()
+        self._member_names.clear()
+        self._cache_user_state(user.id, UserState(is_banned=bool(user.is_banned), last_timeout=user.last_timeout))
+
+        if is_new_user:
+            ENTITIES_COUNT.labels(type='user').inc()
+
+    def _reconcile_stats_periodically(self):
+        while not self._stop_event.wait(self._stats_interval):
+            try:
+                self._reconcile_stats()
+            except Exception as ex:
+                LOGGER.exception(ex)
 
-    def _update_stats(self):
+    def _reconcile_stats(self):
+        """
+        Sets all entity stats to the actual values in the database
+        """
         with self._session_scope() as session:
             chat_count = session.query(Chat).count()
             user_count = session.query(User).count()
+            users_in_chats = session.query(Chat.id, func.count(association_table.c.user_id)).outerjoin(
+                association_table, Chat.id == association_table.c.chat_id).group_by(Chat.id).all()
 
-            ENTITIES_COUNT.labels(type='chat').set(chat_count)
-            ENTITIES_COUNT.labels(type='user').set(user_count)
+        ENTITIES_COUNT.labels(type='chat').set(chat_count)
+        ENTITIES_COUNT.labels(type='user').set(user_count)
 
-            chats = session.query(Chat).all()
-            for chat in chats:
-                USERS_IN_CHAT_COUNT.labels(chat_id=chat.id).set(len(chat.users))
+        USERS_IN_CHAT_COUNT.clear()
+        for chat_id, count in users_in_chats:
+            USERS_IN_CHAT_COUNT.labels(chat_id=chat_id).set(count)
@@ -0,0 +1,107 @@
+#  Copyright (c) 2019 Markus Ressel
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU Affero General Public License as published
+#  by the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU Affero General Public License for more details.
+#
+#  You should have received a copy of the GNU Affero General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import datetime
+from typing import Any, Callable
+
+from deinemudda.persistence import Persistence, UserState
+from deinemudda.persistence.entity.chat import Chat
+from deinemudda.persistence.entity.user import User
+from deinemudda.persistence.settings import ChatSettings
+
+
+class AsyncPersistence:
+    """
+    Awaitable variant of :class:`Persistence`, for use in async handlers.
+    Database access is done in a dedicated thread, so it does not block the event loop.
+    """
+
+    def __init__(self, persistence: Persistence):
+        """
+        :param persistence: the blocking persistence to use
+        """
+        self._persistence = persistence
+        # a single thread keeps database access in order (and SQLite happy)
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="persistence")
+
+    async def _run(self, func: Callable, *args) -> Any:
+        return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+    async def get_chat(self, entity_id: int) -> Chat or None:
+        chat = self._persistence.get_cached_chat(entity_id)
+        if chat is not None:
+            return chat
+        return await self._run(self._persistence.get_chat, entity_id)
+
+    async def sample_member_name(self, chat_id: int) -> str or None:
+        name = self._persistence.sample_cached_member_name(chat_id)
+        if name is not None:
+            return name
+        return await self._run(self._persistence.sample_member_name, chat_id)
+
+    async def get_chat_settings(self, chat_id: int) -> ChatSettings or None:
+        settings = self._persistence.get_cached_chat_settings(chat_id)
+        if settings is not None:
+            return settings
+        return await self._run(self._persistence.get_chat_settings, chat_id)
+
+    async def get_member_count(self, chat_id: int) -> int:
+        return await self._run(self._persistence.get_member_count, chat_id)
+
+    async def add_or_update_chat(self, chat: Chat) -> None:
+        await self._run(self._persistence.add_or_update_chat, chat)
+
+    async def add_or_update_chat_member(self, chat: Chat, user: User) -> None:
+        if self._persistence.is_known_chat_member(chat, user):
+            return
+        await self._run(self._persistence.add_or_update_chat_member, chat, user)
+
+    async def remove_chat_member(self, chat_id: int, user_id: int) -> None:
+        await self._run(self._persistence.remove_chat_member, chat_id, user_id)
+
+    async def delete_chat(self, entity_id: int) -> None:
+        await self._run(self._persistence.delete_chat, entity_id)
+
+    async def get_user(self, entity_id: int) -> User or None:
+        return await self._run(self._persistence.get_user, entity_id)
+
+    async def get_user_by_username(self, username: str) -> User or None:
+        return await self._run(self._persistence.get_user_by_username, username)
+
+    async def get_user_state(self, user_id: int) -> UserState or None:
+        state = self._persistence.get_cached_user_state(user_id)
+        if state is not None:
+            return state
+        return await self._run(self._persistence.get_user_state, user_id)
+
+    async def set_user_banned(self, user_id: int, banned: bool) -> None:
+        await self._run(self._persistence.set_user_banned, user_id, banned)
+
+    async def set_user_timeout(self, user_id: int, timeout: datetime.datetime) -> None:
+        await self._run(self._persistence.set_user_timeout, user_id, timeout)
+
+    async def add_or_update_user(self, user: User) -> None:
+        await self._run(self._persistence.add_or_update_user, user)
+
+    async def flush(self) -> None:
+        await self._run(self._persistence.flush)
+
+    def shutdown(self):
+        """
+        Waits for pending database access to finish and stops the database thread
+        """
+        self._executor.shutdown(wait=True)
@@ -15,6 +15,7 @@
 
 from sqlalchemy import Column, ForeignKey, String, Table, UniqueConstraint, BigInteger, Integer
 from sqlalchemy.orm import relationship
+from sqlalchemy.orm.collections import attribute_mapped_collection
 
 from deinemudda.persistence.entity import Base
 
@@ -35,8 +36,8 @@ class Setting(Base):
 
 
 association_table = Table('association', Base.metadata,
-                          Column('chat_id', BigInteger, ForeignKey('chats.id')),
-                          Column('user_id', BigInteger, ForeignKey('users.id')))
+                          Column('chat_id', BigInteger, ForeignKey('chats.id'), primary_key=True),
+                          Column('user_id', BigInteger, ForeignKey('users.id'), primary_key=True, index=True))
 
 
 class Chat(Base):
@@ -51,25 +52,27 @@ class Chat(Base):
         "User",
         secondary=association_table,
         back_populates="chats",
-        lazy='joined')
+        # a separate IN query, instead of joining every user (and settings) into the chat rows
+        lazy='selectin')
     settings = relationship(
         "Setting",
         back_populates="chat",
         single_parent=True,
         cascade="all, delete-orphan",
-        lazy='joined')
+        # setting key -> setting
+        collection_class=attribute_mapped_collection("key"),
+        lazy='selectin')
 
     def get_setting(self, key: str, default: str) -> str:
-        setting = list(filter(lambda x: x.key == key, self.settings))
-        if len(setting) > 0:
-            return setting[0].value
+        setting = self.settings.get(key, None)
+        if setting is not None:
+            return setting.value
         else:
             return default
 
     def set_setting(self, key: str, value: str):
-        setting = list(filter(lambda x: x.key == key, self.settings))
-        if len(setting) > 0:
-            setting[0].value = value
+        setting = self.settings.get(key, None)
+        if setting is not None:
+            setting.value = value
         else:
-            new_setting = Setting(key=key, value=value)
-            self.settings.append(new_setting)
+            self.settings[key] = Setting(key=key, value=value)
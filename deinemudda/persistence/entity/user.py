@@ -28,7 +28,7 @@ class User(Base):
 
     id = Column(BigInteger, primary_key=True)
 
-    username = Column(String)
+    username = Column(String, index=True)
     first_name = Column(String)
     full_name = Column(String)
 
@@ -39,4 +39,5 @@ class User(Base):
         "Chat",
         secondary=association_table,
         back_populates="users",
-        lazy='joined')
+        # only loaded on access, loading a chat must not load all other chats of its users
+        lazy='select')
@@ -0,0 +1,77 @@
+#  Copyright (c) 2019 Markus Ressel
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU Affero General Public License as published
+#  by the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU Affero General Public License for more details.
+#
+#  You should have received a copy of the GNU Affero General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import threading
+from random import randrange
+from typing import Dict, List
+
+
+class MemberNames:
+    """
+    First names of the members of a chat, which can be updated and sampled in constant time
+    """
+
+    def __init__(self, names: Dict[int, str]):
+        """
+        :param names: user id -> first name
+        """
+        self._user_ids: List[int] = list(names.keys())
+        self._names: List[str] = list(names.values())
+        # user id -> position in the lists above
+        self._positions: Dict[int, int] = dict(map(lambda x: (x[1], x[0]), enumerate(self._user_ids)))
+        self._lock = threading.Lock()
+
+    def set(self, user_id: int, first_name: str):
+        """
+        Adds a member, or updates its name
+        :param user_id: the user id
+        :param first_name: the first name of the user
+        """
+        with self._lock:
+            position = self._positions.get(user_id, None)
+            if position is None:
+                self._positions[user_id] = len(self._user_ids)
+                self._user_ids.append(user_id)
+                self._names.append(first_name)
+            else:
+                self._names[position] = first_name
+
+    def remove(self, user_id: int):
+        """
+        :param user_id: the user id of the member to remove
+        """
+        with self._lock:
+            position = self._positions.pop(user_id, None)
+            if position is None:
+                return
+            # move the last member into the gap
+            last_user_id = self._user_ids.pop()
+            last_name = self._names.pop()
+            if last_user_id != user_id:
+                self._user_ids[position] = last_user_id
+                self._names[position] = last_name
+                self._positions[last_user_id] = position
+
+    def sample(self) -> str or None:
+        """
+        :return: the first name of a random member, or None if there are no members
+        """
+        with self._lock:
+            if len(self._names) <= 0:
+                return None
+            return self._names[randrange(len(self._names))]
+
+    def __len__(self) -> int:
+        return len(self._names)
@@ -0,0 +1,48 @@
+#  Copyright (c) 2019 Markus Ressel
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU Affero General Public License as published
+#  by the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU Affero General Public License for more details.
+#
+#  You should have received a copy of the GNU Affero General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import logging
+from typing import Dict
+
+from deinemudda.const import SETTINGS_ANTISPAM_ENABLED_KEY, SETTINGS_ANTISPAM_ENABLED_DEFAULT, \
+    SETTINGS_TRIGGER_PROBABILITY_KEY, SETTINGS_TRIGGER_PROBABILITY_DEFAULT
+
+LOGGER = logging.getLogger(__name__)
+LOGGER.setLevel(logging.DEBUG)
+
+
+class ChatSettings:
+    """
+    Settings of a chat, parsed into native types once.
+    Settings that are not stored use their default value.
+    """
+
+    def __init__(self, values: Dict[str, str]):
+        """
+        :param values: stored setting key -> value
+        """
+        self.antispam_enabled: bool = values.get(
+            SETTINGS_ANTISPAM_ENABLED_KEY, SETTINGS_ANTISPAM_ENABLED_DEFAULT) == SETTINGS_ANTISPAM_ENABLED_DEFAULT
+        self.trigger_probability: float = self._parse_float(
+            values, SETTINGS_TRIGGER_PROBABILITY_KEY, SETTINGS_TRIGGER_PROBABILITY_DEFAULT)
+
+    @staticmethod
+    def _parse_float(values: Dict[str, str], key: str, default: str) -> float:
+        value = values.get(key, default)
+        try:
+            return float(value)
+        except ValueError:
+            LOGGER.warning(f"Invalid value for setting {key}: {value}, using default {default}")
+            return float(default)
@@ -0,0 +1,117 @@
+#  Copyright (c) 2019 Markus Ressel
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU Affero General Public License as published
+#  by the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU Affero General Public License for more details.
+#
+#  You should have received a copy of the GNU Affero General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import sys
+import time
+from array import array
+from typing import Dict
+
+from deinemudda.stats import RATE_TRACKER_USERS_COUNT, RATE_TRACKER_USER_BYTES, RATE_TRACKER_SWEEP_TIME
+
+
+class _Window:
+    """
+    Ring buffer with the monotonic times of the latest messages of a single user
+    """
+    __slots__ = ("times", "position")
+
+    def __init__(self, size: int):
+        # unused slots are never within the window
+        self.times = array("d", [float("-inf")]) * size
+        self.position = 0
+
+
+class MessageRateTracker:
+    """
+    Counts the messages of each user within a sliding time window.
+    Only the times of the latest `max_messages` messages are kept per user, so memory usage per user is constant,
+    and users without messages in the window are removed by a sweep that runs at most once per window.
+    Not thread safe, meant to be used from the event loop.
+    """
+
+    def __init__(self, name: str, window: float, max_messages: int):
+        """
+        :param name: name of this tracker, used to label its metrics
+        :param window: length of the time window in seconds
+        :param max_messages: maximum number of messages to count per user
+        """
+        self._name = name
+        self._window = window
+        self._max_messages = max_messages
+        self._windows: Dict[int, _Window] = {}
+        self._last_sweep = time.monotonic()
+
+        sample = _Window(max_messages)
+        # the dict entry is not counted, it is shared by all entries and grows in steps
+        self.bytes_per_user = sys.getsizeof(sample) + sys.getsizeof(sample.times) + sys.getsizeof(2 ** 40)
+        RATE_TRACKER_USER_BYTES.labels(tracker=self._name).set(self.bytes_per_user)
+        RATE_TRACKER_USERS_COUNT.labels(tracker=self._name).set(0)
+
+    def add(self, user_id: int) -> int:
+        """
+        Records a message
+        :param user_id: the user that sent the message
+        :return: number of messages of this user within the window, including this one, at most `max_messages`
+        """
+        now = time.monotonic()
+        if now - self._last_sweep >= self._window:
+            self.sweep(now)
+
+        window = self._windows.get(user_id, None)
+        if window is None:
+            window = _Window(self._max_messages)
+            self._windows[user_id] = window
+            RATE_TRACKER_USERS_COUNT.labels(tracker=self._name).set(len(self._windows))
+
+        window.times[window.position] = now
+        window.position = (window.position + 1) % self._max_messages
+
+        return self._count(window, now)
+
+    def count(self, user_id: int) -> int:
+        """
+        :param user_id: the user id
+        :return: number of messages of this user within the window, at most `max_messages`
+        """
+        window = self._windows.get(user_id, None)
+        if window is None:
+            return 0
+        return self._count(window, time.monotonic())
+
+    def sweep(self, now: float = None):
+        """
+        Removes all users without messages in the window
+        :param now: the current monotonic time
+        """
+        if now is None:
+            now = time.monotonic()
+        start = time.perf_counter()
+        oldest_allowed = now - self._window
+        # the latest message is right before the current position of the ring buffer
+        idle = list(map(lambda x: x[0], filter(
+            lambda x: x[1].times[x[1].position - 1] <= oldest_allowed, self._windows.items())))
+        for user_id in idle:
+            del self._windows[user_id]
+        self._last_sweep = now
+
+        RATE_TRACKER_USERS_COUNT.labels(tracker=self._name).set(len(self._windows))
+        RATE_TRACKER_SWEEP_TIME.labels(tracker=self._name).observe(time.perf_counter() - start)
+
+    def __len__(self) -> int:
+        return len(self._windows)
+
+    def _count(self, window: _Window, now: float) -> int:
+        oldest_allowed = now - self._window
+        return len(list(filter(lambda x: x > oldest_allowed, window.times)))
@@ -13,16 +13,24 @@
 #  You should have received a copy of the GNU Affero General Public License
 #  along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
+import asyncio
 import logging
 import re
+import time
 from random import random
-from typing import List
+from typing import List, Tuple
 
 from deinemudda import util
-from deinemudda.const import SETTINGS_TRIGGER_PROBABILITY_KEY, SETTINGS_TRIGGER_PROBABILITY_DEFAULT
-from deinemudda.persistence import Persistence, Chat
+from deinemudda.config import AppConfig
+from deinemudda.const import SETTINGS_TRIGGER_PROBABILITY_DEFAULT
+from deinemudda.persistence.async_persistence import AsyncPersistence
+from deinemudda.response import nlp
+from deinemudda.response.matcher import RuleMatcher
+from deinemudda.response.ordering import RuleOrder
 from deinemudda.response.rule import ResponseRule
-from deinemudda.stats import RESPONSES_COUNT
+from deinemudda.stats import RESPONSES_COUNT, MESSAGES_COUNT, MESSAGE_STAGE_TIME, MESSAGE_STAGE_SKIPS_COUNT, \
+    RULE_MATCH_TIME, RULE_RESPONSE_TIME, RULE_ATTEMPTS_COUNT, RULE_HITS_COUNT, RULE_NO_RESPONSE_COUNT
+from deinemudda.worker import WorkerPool, WorkerPoolSaturatedError
 
 LOGGER = logging.getLogger(__name__)
 LOGGER.setLevel(logging.DEBUG)
@@ -33,9 +41,24 @@ class ResponseManager:
     Manages response rules
     """
 
-    def __init__(self, persistence: Persistence):
-        self._persistence: Persistence = persistence
+    def __init__(self, config: AppConfig, persistence: AsyncPersistence):
+        self._config = config
+        self._persistence: AsyncPersistence = persistence
         self.response_rules: [ResponseRule] = self._find_rules()
+        for response_rule in self.response_rules:
+            response_rule.configure(self._config)
+        self._matcher = RuleMatcher(self.response_rules)
+        self.rule_order = RuleOrder(self.response_rules, self._config.RULE_ORDER_INTERVAL.value)
+        self._worker_pool = WorkerPool(
+            "nlp",
+            worker_type=self._config.NLP_WORKER_TYPE.value,
+            workers=self._config.NLP_WORKERS.value,
+            queue_size=self._config.NLP_QUEUE_SIZE.value,
+            timeout=self._config.NLP_TIMEOUT.value,
+            batch_window=self._config.NLP_BATCH_WINDOW.value,
+            batch_size=self._config.NLP_BATCH_SIZE.value,
+            initializer=nlp.warm_up
+        )
 
     @staticmethod
     def _find_rules() -> List[ResponseRule]:
@@ -48,36 +71,171 @@ class ResponseManager:
         rule_instances = list(map(lambda x: x(), rule_classes))
         return sorted(rule_instances, key=lambda x: x.__priority__, reverse=True)
 
-    def find_matching_rule(self, chat: Chat, sender: str, message: str) -> str or None:
+    async def process_message(self, chat_id: int, sender: str, message: str) -> str or None:
         """
-        Processes the given message and returns a response if one of the response rules match
-        :param chat: the chat this message was sent in
+        Processes the given message and returns a response if one of the response rules match.
+        Processing is done in stages ordered by their cost, so a message that can not trigger
+        a response is dismissed as cheap as possible.
+        :param chat_id: the id of the chat this message was sent in
         :param sender: the message sender
         :param message: the message
         :return: Response message or None
         """
-        normalized_message = self._normalize(message)
+        with MESSAGE_STAGE_TIME.labels(stage="size").time():
+            fits_size = len(message) in self._config.CHAR_COUNT_RANGE.value \
+                        and len(message.split()) in self._config.WORD_COUNT_RANGE.value
+        if not fits_size:
+            MESSAGE_STAGE_SKIPS_COUNT.labels(stage="size").inc()
+            return None
+
+        MESSAGES_COUNT.labels(chat_id=chat_id).inc()
+
+        with MESSAGE_STAGE_TIME.labels(stage="chance").time():
+            triggered = random() < await self._get_trigger_chance(chat_id)
+        if not triggered:
+            MESSAGE_STAGE_SKIPS_COUNT.labels(stage="chance").inc()
+            return None
+
+        with MESSAGE_STAGE_TIME.labels(stage="normalize").time():
+            normalized_message = self._normalize(message)
+
+        with MESSAGE_STAGE_TIME.labels(stage="match").time():
+            response = await self.find_matching_rule(chat_id, sender, message, normalized_message)
+        if response is None:
+            MESSAGE_STAGE_SKIPS_COUNT.labels(stage="match").inc()
+        return response
 
+    async def find_matching_rule(self, chat_id: int, sender: str, message: str,
+                                 normalized_message: str) -> str or None:
+        """
+        Returns the response of the first matching response rule
+        :param chat_id: the id of the chat this message was sent in
+        :param sender: the message sender
+        :param message: the message
+        :param normalized_message: the normalized message
+        :return: Response message or None
+        """
         # print tags and chunks for debugging
         # from textblob_de import TextBlobDE as TextBlob
         # blob = TextBlob(normalized_message)
         # parsed = blob.parse()
 
-        global_trigger_chance = float(chat.get_setting(SETTINGS_TRIGGER_PROBABILITY_KEY,
-                                                       default=SETTINGS_TRIGGER_PROBABILITY_DEFAULT))
-        if random() >= global_trigger_chance:
-            # do not respond
-            return
+        # CPU time of the event loop thread while waiting for the database, which is used by other tasks
+        member_name_time = 0.0
 
-        for response_rule in self.response_rules:
+        async def member_name() -> str:
+            nonlocal member_name_time
+            start_cpu = time.thread_time()
+            try:
+                # the sender is a member too
+                return await self._persistence.sample_member_name(chat_id) or sender
+            finally:
+                member_name_time += time.thread_time() - start_cpu
+
+        candidates = self._matcher.find_candidates(message)
+        for response_rule in self.rule_order.rules:
             # TODO: get trigger chance for specific rule based on chat id
             # trigger_chance = int(chat.get_setting("{}-TriggerChance".format(response_rule.__id__), default="1"))
 
-            if response_rule.matches(message):
-                response = response_rule.get_response(chat, sender, normalized_message)
-                if response:
-                    RESPONSES_COUNT.labels(chat_id=chat.id, rule=response_rule.__id__).inc()
-                    return response
+            if response_rule not in candidates:
+                continue
+
+            rule_id = response_rule.__id__
+            RULE_ATTEMPTS_COUNT.labels(rule=rule_id).inc()
+            start = time.perf_counter()
+            matches, cpu_time = await self._check_rule(response_rule, message, normalized_message)
+            RULE_MATCH_TIME.labels(rule=rule_id).observe(time.perf_counter() - start)
+
+            response = None
+            if matches:
+                RULE_HITS_COUNT.labels(rule=rule_id).inc()
+                start = time.perf_counter()
+                start_cpu = time.thread_time()
+                member_name_time = 0.0
+                response = await response_rule.get_response(member_name, sender, normalized_message)
+                cpu_time += time.thread_time() - start_cpu - member_name_time
+                RULE_RESPONSE_TIME.labels(rule=rule_id).observe(time.perf_counter() - start)
+                if not response:
+                    RULE_NO_RESPONSE_COUNT.labels(rule=rule_id).inc()
+
+            self.rule_order.record(response_rule, hit=bool(response), cpu_time=cpu_time)
+
+            if response:
+                RESPONSES_COUNT.labels(chat_id=chat_id, rule=rule_id).inc()
+                return response
+
+    async def _check_rule(self, response_rule: ResponseRule, message: str,
+                          normalized_message: str) -> Tuple[bool, float]:
+        """
+        :param response_rule: a candidate rule for the given message
+        :param message: the message
+        :param normalized_message: the normalized message
+        :return: True if the given rule matches the message and is able to respond to it,
+                 and the CPU time this took in seconds
+        """
+        cpu_time = 0.0
+        # the pattern search is cheap, so rules with a pattern are only analyzed if it matches
+        if response_rule.__pattern__ is None:
+            analyzed, cpu_time = await self._analyze(response_rule, message)
+            if not analyzed:
+                return False, cpu_time
+
+        start_cpu = time.thread_time()
+        matches = response_rule.matches(message)
+        cpu_time += time.thread_time() - start_cpu
+        if not matches:
+            return False, cpu_time
+
+        analyzed, analysis_time = await self._analyze(response_rule, normalized_message)
+        return analyzed, cpu_time + analysis_time
+
+    async def _get_trigger_chance(self, chat_id: int) -> float:
+        """
+        :param chat_id: the id of the chat
+        :return: the probability of responding to a message in the given chat
+        """
+        settings = await self._persistence.get_chat_settings(chat_id)
+        if settings is None:
+            return float(SETTINGS_TRIGGER_PROBABILITY_DEFAULT)
+        return settings.trigger_probability
+
+    async def _analyze(self, response_rule: ResponseRule, message: str) -> Tuple[bool, float]:
+        """
+        Runs the analysis of the given rule for the given message in the worker pool, if necessary
+        :param response_rule: the rule
+        :param message: the message
+        :return: True if the rule can handle the message now, False if the analysis could not be done,
+                 and the CPU time of the analysis in seconds
+        """
+        if not response_rule.needs_analysis(message):
+            return True, 0.0
+
+        try:
+            analysis, cpu_time = await self._worker_pool.run_batched_timed(response_rule.analyze, message)
+        except WorkerPoolSaturatedError:
+            LOGGER.debug(f"Skipping {response_rule.__id__}, the worker pool is saturated")
+            return False, 0.0
+        except asyncio.TimeoutError:
+            LOGGER.debug(f"Skipping {response_rule.__id__}, analysis took too long")
+            return False, 0.0
+
+        start_cpu = time.thread_time()
+        response_rule.add_analysis(message, analysis)
+        return True, cpu_time + time.thread_time() - start_cpu
+
+    def warm_up(self):
+        """
+        Loads everything the response rules need, so the first messages are processed at full speed
+        """
+        for response_rule in self.response_rules:
+            response_rule.warm_up()
+        self._worker_pool.start()
+
+    def shutdown(self):
+        """
+        Stops the worker pool
+        """
+        self._worker_pool.shutdown()
 
     @staticmethod
     def _normalize(message: str):
@@ -0,0 +1,139 @@
+#  Copyright (c) 2019 Markus Ressel
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU Affero General Public License as published
+#  by the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU Affero General Public License for more details.
+#
+#  You should have received a copy of the GNU Affero General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import re
+import threading
+from typing import FrozenSet, Iterable, Set
+
+# adjectives that are too common to respond to
+ADJECTIVE_STOP_WORDS = frozenset([
+    "vermutlich",
+    "selbe",
+    "gute",
+    "lieber",
+    "eigentlich",
+    "jam",
+    "neues",
+    "leid",
+    "gleich",
+    "du",
+])
+
+# STTS tags the pattern.de tagger maps to JJ, which the chunker requires for an adjective phrase
+ADJECTIVE_TAGS = frozenset(["ADJ", "ADJA", "ADJD"])
+
+# contextual rule commands that only fire for a specific current word, mapped to the index of that word
+WORD_CONDITIONED_CONTEXT_RULES = {
+    "curwd": 3,
+    "wdnexttag": 3,
+    "wdand2aft": 3,
+    "wdand2tagaft": 3,
+    "rbigram": 3,
+    "wdprevtag": 4,
+    "wdand2tagbfr": 4,
+    "lbigram": 4,
+}
+
+NUMBER_PATTERN = re.compile(r"^[0-9\-,.:/%$]+$")
+WORD_PATTERN = re.compile(r"\w+")
+
+
+class AdjectiveLexicon:
+    """
+    Cheap, lexicon based approximation of the pattern.de tagger, used to avoid parsing messages
+    that can not contain an adjective phrase the AdjectiveCounterIntelligenceRule would respond to.
+
+    The set of adjectives is derived from the tagger data the first time it is needed, so it always
+    matches the installed tagger version.
+    """
+
+    def __init__(self, stop_words: Iterable[str] = ADJECTIVE_STOP_WORDS):
+        """
+        :param stop_words: adjectives to ignore (lowercase)
+        """
+        self._stop_words = frozenset(stop_words)
+        self._lock = threading.Lock()
+        self._adjectives = None
+        self._lexicon = None
+        self._morphology = None
+
+    @property
+    def adjectives(self) -> FrozenSet[str]:
+        """
+        :return: all words the tagger may tag as an adjective, regardless of their context
+        """
+        self._load()
+        return self._adjectives
+
+    def may_match(self, message: str) -> bool:
+        """
+        Checks if the given message may contain an adjective that is not a stop word
+        :param message: the message
+        :return: False if the message does not contain such an adjective, True if it might
+        """
+        self._load()
+        for word in self._words(message):
+            if word.lower() in self._stop_words:
+                continue
+            if self._may_be_adjective(word):
+                return True
+        return False
+
+    @staticmethod
+    def _words(message: str) -> Set[str]:
+        """
+        The tokenizer used by TextBlobDE does not always split words the way a simple regex does
+        (f.ex. "E-Mail" or "gibt's"), so both whole (whitespace separated) words and their parts are checked.
+        :param message: the message
+        :return: all words of the message
+        """
+        words = set()
+        for chunk in message.split():
+            parts = WORD_PATTERN.findall(chunk)
+            words.update(parts)
+            if len(parts) > 1:
+                words.add(chunk.strip(".,;:!?\"'()[]{}"))
+        return words
+
+    def _may_be_adjective(self, word: str) -> bool:
+        word = word.replace("ß", "ss")
+        if word in self._adjectives or word.lower() in self._adjectives:
+            return True
+        if word in self._lexicon or word.lower() in self._lexicon:
+            return False
+        if NUMBER_PATTERN.match(word) is not None:
+            return False
+        # unknown words are tagged by suffix rules
+        return self._morphology.apply([word, "NN"])[1] in ADJECTIVE_TAGS
+
+    def _load(self):
+        if self._adjectives is not None:
+            return
+
+        with self._lock:
+            if self._adjectives is not None:
+                return
+
+            from textblob_de.ext._pattern.text.de import parser
+            adjectives = set(map(lambda x: x[0], filter(lambda x: x[1] in ADJECTIVE_TAGS, parser.lexicon.items())))
+            # words that contextual rules turn into an adjective
+            for rule in parser.context:
+                cmd = rule[2].lower()
+                if rule[1] in ADJECTIVE_TAGS and cmd in WORD_CONDITIONED_CONTEXT_RULES:
+                    adjectives.add(rule[WORD_CONDITIONED_CONTEXT_RULES[cmd]])
+
+            self._lexicon = parser.lexicon
+            self._morphology = parser.morphology
+            self._adjectives = frozenset(adjectives)
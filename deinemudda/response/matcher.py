@@ -0,0 +1,69 @@
+#  Copyright (c) 2019 Markus Ressel
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU Affero General Public License as published
+#  by the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU Affero General Public License for more details.
+#
+#  You should have received a copy of the GNU Affero General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import re
+from typing import List, Set, Dict
+
+from deinemudda.response.rule import ResponseRule
+
+
+class RuleMatcher:
+    """
+    Finds the rules that may match a message. An index of the rule tokens is used, so only the patterns
+    of rules that have a token in the message have to be searched.
+    """
+
+    def __init__(self, rules: List[ResponseRule]):
+        """
+        :param rules: the rules to match, ordered by priority
+        """
+        self._untokenized_rules: Set[ResponseRule] = set()
+        self._token_index: Dict[str, Set[ResponseRule]] = {}
+
+        for response_rule in rules:
+            if len(response_rule.__tokens__) <= 0:
+                self._untokenized_rules.add(response_rule)
+            for token in response_rule.__tokens__:
+                self._token_index.setdefault(token.lower(), set()).add(response_rule)
+
+        # the longest token at the start of a word is matched, which includes the rules of all shorter tokens
+        # that are a prefix of it (and therefore of the word too)
+        tokens = sorted(self._token_index.keys(), key=len, reverse=True)
+        # every token gets its own named group, because a case insensitive match of a token
+        # does not necessarily lower case to the token itself (e.g. "ſ" matches "s")
+        self._token_rules: Dict[str, Set[ResponseRule]] = {}
+        groups = []
+        for i, token in enumerate(tokens):
+            group = f"t{i}"
+            self._token_rules[group] = set().union(
+                *map(lambda x: self._token_index[x], filter(token.startswith, tokens)))
+            groups.append(f"(?P<{group}>{re.escape(token)})")
+        self._token_pattern = re.compile(r"(?<!\w)(?:" + "|".join(groups) + ")", re.IGNORECASE) \
+            if len(tokens) > 0 else None
+
+    def find_candidates(self, message: str) -> Set[ResponseRule]:
+        """
+        Finds all rules that might match the given message. The pattern of the returned rules still has to be
+        searched using :func:`ResponseRule.matches`, separately for each rule, which keeps the literal prefix
+        and anchor optimizations of each pattern.
+        :param message: the message
+        :return: all rules that have a token which is the prefix of a word in the message,
+                 as well as all rules without any tokens
+        """
+        result = set(self._untokenized_rules)
+        if self._token_pattern is not None:
+            for group in set(map(lambda x: x.lastgroup, self._token_pattern.finditer(message))):
+                result.update(self._token_rules[group])
+        return result
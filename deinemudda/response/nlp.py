@@ -0,0 +1,85 @@
+#  Copyright (c) 2019 Markus Ressel
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU Affero General Public License as published
+#  by the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU Affero General Public License for more details.
+#
+#  You should have received a copy of the GNU Affero General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+# Functions in this module are CPU heavy and side effect free,
+# so they can be run by a WorkerPool in a separate process.
+
+import threading
+from typing import List
+
+# the tokenizer and parser are expensive to create, so every thread keeps its own instance
+_local = threading.local()
+# the tagger and lexicon are shared by all threads and loaded lazily on first use, which is not thread safe
+_load_lock = threading.Lock()
+
+
+def _get_blobber():
+    blobber = getattr(_local, "blobber", None)
+    if blobber is None:
+        with _load_lock:
+            from textblob_de.blob import BlobberDE
+            blobber = BlobberDE()
+            blobber("Das ist ein schöner Tag.").parse()
+        _local.blobber = blobber
+    return blobber
+
+
+def warm_up():
+    """
+    Loads the tokenizer, tagger and lexicon
+    """
+    _get_blobber()
+
+
+def find_adjp(message: str) -> List[str]:
+    """
+    Parses the given message and finds all words that are part of an adjective phrase
+    :param message: the message
+    :return: list of words, empty if there are none
+    """
+    blob = _get_blobber()(message)
+    parsed = blob.parse()
+
+    result = extract_adjp(parsed)
+    if result is None:
+        result = []
+
+    return result
+
+
+def extract_adjp(parsed):
+    result = []
+    sentences = parsed.split()
+    for sentence in sentences:
+        for word_tuple in sentence:
+            word = word_tuple[0]
+            if any(map(lambda x: "ADJP" in x, word_tuple[1:])):
+                result.append(word)
+
+    if len(result) <= 0:
+        return None
+    else:
+        return result
+
+
+def extract_np(parsed):
+    result = []
+    sentences = parsed.split()
+    for sentence in sentences:
+        for word_tuple in sentence:
+            word = word_tuple[0]
+            if any(map(lambda x: "-NP" in x, word_tuple[1:])):
+                result.append(word)
+    return result
@@ -0,0 +1,112 @@
+#  Copyright (c) 2019 Markus Ressel
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU Affero General Public License as published
+#  by the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU Affero General Public License for more details.
+#
+#  You should have received a copy of the GNU Affero General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import datetime
+import logging
+import math
+import time
+from typing import Dict, List
+
+from deinemudda.response.rule import ResponseRule
+
+LOGGER = logging.getLogger(__name__)
+LOGGER.setLevel(logging.DEBUG)
+
+
+class RuleStats:
+    """
+    Observed performance of a response rule
+    """
+
+    def __init__(self):
+        self.attempts = 0
+        self.hits = 0
+        self.total_cpu_time = 0.0
+
+    @property
+    def mean_cpu_time(self) -> float or None:
+        """
+        :return: mean CPU time of an evaluation in seconds, None if the rule was not evaluated yet
+        """
+        if self.attempts <= 0:
+            return None
+        return self.total_cpu_time / self.attempts
+
+    @property
+    def score(self) -> float:
+        """
+        :return: expected number of hits per second of CPU time
+        """
+        if self.attempts <= 0:
+            # evaluate unknown rules first, to learn about them
+            return math.inf
+        # the hit rate is smoothed, so a single (un)lucky message does not dominate it
+        hit_rate = (self.hits + 1) / (self.attempts + 2)
+        return hit_rate / max(self.mean_cpu_time, 1e-9)
+
+
+class RuleOrder:
+    """
+    Keeps response rules sorted by their priority and, within the same priority,
+    by their expected number of hits per unit of CPU time.
+    """
+
+    def __init__(self, rules: List[ResponseRule], interval: datetime.timedelta):
+        """
+        :param rules: the rules
+        :param interval: time between reordering the rules
+        """
+        self._rules = sorted(rules, key=lambda x: x.__priority__, reverse=True)
+        self._stats: Dict[ResponseRule, RuleStats] = {rule: RuleStats() for rule in rules}
+        self._interval = interval.total_seconds()
+        self._last_reorder = time.monotonic()
+
+    @property
+    def rules(self) -> List[ResponseRule]:
+        """
+        :return: the rules in the order they should be evaluated
+        """
+        return self._rules
+
+    def get_stats(self, rule: ResponseRule) -> RuleStats:
+        """
+        :param rule: the rule
+        :return: observed performance of the given rule
+        """
+        return self._stats[rule]
+
+    def record(self, rule: ResponseRule, hit: bool, cpu_time: float):
+        """
+        Records an evaluation of a rule and reorders the rules if the interval has passed
+        :param rule: the rule
+        :param hit: True if the rule responded to the message
+        :param cpu_time: CPU time of the evaluation in seconds, including the time spent in workers
+        """
+        stats = self._stats[rule]
+        stats.attempts += 1
+        if hit:
+            stats.hits += 1
+        stats.total_cpu_time += cpu_time
+
+        if time.monotonic() - self._last_reorder >= self._interval:
+            self.reorder()
+
+    def reorder(self):
+        """
+        Sorts the rules by priority and, within the same priority, by their score
+        """
+        self._rules = sorted(self._rules, key=lambda x: (x.__priority__, self._stats[x].score), reverse=True)
+        self._last_reorder = time.monotonic()
+        LOGGER.debug(f"Rule order: {', '.join(map(lambda x: x.__id__, self._rules))}")
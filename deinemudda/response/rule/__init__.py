@@ -13,9 +13,12 @@
 #  You should have received a copy of the GNU Affero General Public License
 #  along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
+import re
 from abc import abstractmethod
+from functools import cached_property
+from typing import Any, Awaitable, Callable, Tuple
 
-from deinemudda.persistence import Chat
+from deinemudda.config import AppConfig
 
 
 class ResponseRule:
@@ -39,10 +42,84 @@ class ResponseRule:
     def __priority__(self) -> float:
         return 0.0
 
-    @abstractmethod
-    def matches(self, message: str) -> bool:
+    @property
+    def __pattern__(self) -> str or None:
+        """
+        :return: a (case insensitive) regex that has to be found in a message for this rule to match,
+                 or None if this rule implements :func:`matches` itself
+        """
+        return None
+
+    @property
+    def __tokens__(self) -> Tuple[str, ...]:
+        """
+        :return: words (or word prefixes) of which at least one has to be contained in a message
+                 for this rule to match, an empty tuple if this rule has to be checked for every message
+        """
+        return ()
+
+    @cached_property
+    def compiled_pattern(self) -> re.Pattern or None:
+        """
+        :return: the compiled version of :attr:`__pattern__`
+        """
+        if self.__pattern__ is None:
+            return None
+        return re.compile(self.__pattern__, re.IGNORECASE)
+
+    def configure(self, config: AppConfig):
+        """
+        Called once after construction to apply the application configuration
+        :param config: the application configuration
+        """
+        pass
+
+    def warm_up(self):
+        """
+        Called once on startup to load everything this rule needs to respond at full speed
+        """
+        if self.__pattern__ is not None:
+            self.compiled_pattern
+
+    def needs_analysis(self, message: str) -> bool:
+        """
+        Rules that depend on a CPU heavy analysis of the message implement :func:`analyze`
+        and return True here, until :func:`add_analysis` was called with its result.
+        :param message: the message
+        :return: True if :func:`analyze` has to be run before this rule can handle the given message
+        """
+        return False
+
+    @staticmethod
+    def analyze(message: str) -> Any:
+        """
+        CPU heavy, side effect free analysis of a message.
+        This is run in a worker pool (which may use separate processes) so it must be picklable.
+        :param message: the message
+        :return: the analysis result, which is passed to :func:`add_analysis`
+        """
         raise NotImplementedError()
 
+    def add_analysis(self, message: str, analysis: Any):
+        """
+        Stores the result of :func:`analyze` for later use in :func:`matches` and :func:`get_response`
+        :param message: the message
+        :param analysis: the result of :func:`analyze`
+        """
+        pass
+
+    def matches(self, message: str) -> bool:
+        if self.compiled_pattern is None:
+            raise NotImplementedError()
+        return self.compiled_pattern.search(message) is not None
+
     @abstractmethod
-    def get_response(self, chat: Chat, sender: str, message: str) -> str or None:
+    async def get_response(self, member_name: Callable[[], Awaitable[str]], sender: str, message: str) -> str or None:
+        """
+        :param member_name: returns the first name of a random member of the chat,
+                            which may access the database, so it should only be called if the name is used
+        :param sender: the first name of the message sender
+        :param message: the normalized message
+        :return: the response, or None if this rule does not respond to the message after all
+        """
         raise NotImplementedError()
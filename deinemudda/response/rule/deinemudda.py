@@ -14,23 +14,27 @@
 #  along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
 import re
-from random import randint, choice
-from typing import List, Tuple
-
-from deinemudda.persistence import Chat
+from random import randint
+from typing import Awaitable, Callable, List, Tuple
+
+from deinemudda.cache import LruCache
+from deinemudda.config import AppConfig
+from deinemudda.const import DEFAULT_NLP_CACHE_SIZE, DEFAULT_NLP_CACHE_TTL
+from deinemudda.response.lexicon import AdjectiveLexicon, ADJECTIVE_STOP_WORDS
+from deinemudda.response.nlp import find_adjp
 from deinemudda.response.rule import ResponseRule
+from deinemudda.stats import ADJECTIVE_LEXICON_COUNT
 
 
 class GenitiveFirstRule(ResponseRule):
     __description__ = "Respond to 'wen' questions in german"
 
-    def matches(self, message: str) -> bool:
-        return re.search(r"(^| )(wen)(\?| (.)+)", message, re.IGNORECASE) is not None
+    __pattern__ = r"(^| )(wen)(\?| (.)+)"
+    __tokens__ = ("wen",)
 
-    def get_response(self, chat: Chat, sender: str, message: str) -> str or None:
+    async def get_response(self, member_name: Callable[[], Awaitable[str]], sender: str, message: str) -> str or None:
         if randint(0, 3) == 3:
-            user = choice(chat.users)
-            return f"{user.first_name}'s mudda"
+            return f"{await member_name()}'s mudda"
         else:
             return 'deine mudda'
 
@@ -38,13 +42,12 @@ class GenitiveFirstRule(ResponseRule):
 class GenitiveSecondRule(ResponseRule):
     __description__ = "Respond to 'wessen' questions in german"
 
-    def matches(self, message: str) -> bool:
-        return re.search(r"(^| )(wessen)(| (.)+)", message, re.IGNORECASE) is not None
+    __pattern__ = r"(^| )(wessen)(| (.)+)"
+    __tokens__ = ("wessen",)
 
-    def get_response(self, chat: Chat, sender: str, message: str) -> str or None:
+    async def get_response(self, member_name: Callable[[], Awaitable[str]], sender: str, message: str) -> str or None:
         if randint(0, 3) == 3:
-            user = choice(chat.users)
-            return f"von {user.first_name}'s mudda"
+            return f"von {await member_name()}'s mudda"
         else:
             return 'von deiner mudda'
 
@@ -52,13 +55,12 @@ class GenitiveSecondRule(ResponseRule):
 class DativRule(ResponseRule):
     __description__ = "Respond to 'wem' questions in german"
 
-    def matches(self, message: str) -> bool:
-        return re.search(r"(^| )(wem)(| (.)+)", message, re.IGNORECASE) is not None
+    __pattern__ = r"(^| )(wem)(| (.)+)"
+    __tokens__ = ("wem",)
 
-    def get_response(self, chat: Chat, sender: str, message: str) -> str or None:
+    async def get_response(self, member_name: Callable[[], Awaitable[str]], sender: str, message: str) -> str or None:
         if randint(0, 3) == 3:
-            user = choice(chat.users)
-            return f"{user.first_name}'s mudda"
+            return f"{await member_name()}'s mudda"
         else:
             return 'deiner mudda'
 
@@ -66,13 +68,12 @@ class DativRule(ResponseRule):
 class WhoGermanRule(ResponseRule):
     __description__ = "Respond to 'who' questions in german"
 
-    def matches(self, message: str) -> bool:
-        return re.search(r"(^| )(irgend)?(wer|jemand)(| (.)+)\?", message, re.IGNORECASE) is not None
+    __pattern__ = r"(^| )(irgend)?(wer|jemand)(| (.)+)\?"
+    __tokens__ = ("irgend", "wer", "jemand")
 
-    def get_response(self, chat: Chat, sender: str, message: str) -> str or None:
+    async def get_response(self, member_name: Callable[[], Awaitable[str]], sender: str, message: str) -> str or None:
         if randint(0, 3) == 3:
-            user = choice(chat.users)
-            return f"{user.first_name}'s mudda"
+            return f"{await member_name()}'s mudda"
         else:
             return 'deine mudda'
 
@@ -80,33 +81,30 @@ class WhoGermanRule(ResponseRule):
 class WhoEnglishRule(ResponseRule):
     __description__ = "Respond to 'who' questions in english"
 
-    def matches(self, message: str) -> bool:
-        return re.search(r"who(| (.)+)\?", message, re.IGNORECASE) is not None
+    __pattern__ = r"who(| (.)+)\?"
 
-    def get_response(self, chat: Chat, sender: str, message: str) -> str or None:
+    async def get_response(self, member_name: Callable[[], Awaitable[str]], sender: str, message: str) -> str or None:
         return 'your momma'
 
 
 class WhyRule(ResponseRule):
     __description__ = "Respond to 'why' questions"
 
-    def matches(self, message: str) -> bool:
-        return re.search(r"(^| )(warum|wieso|weshalb|weswegen|why)(| (.)+)", message, re.IGNORECASE) is not None
+    __pattern__ = r"(^| )(warum|wieso|weshalb|weswegen|why)(| (.)+)"
+    __tokens__ = ("warum", "wieso", "weshalb", "weswegen", "why")
 
-    def get_response(self, chat: Chat, sender: str, message: str) -> str or None:
+    async def get_response(self, member_name: Callable[[], Awaitable[str]], sender: str, message: str) -> str or None:
         return 'sex'
 
 
 class ReflectCounterIntelligenceRule(ResponseRule):
     __description__ = "Respond to messages containing phrases similar to 'your mother'"
 
-    regex = r"^dei(ne)? (mudda|mutter|mama)"
-
-    def matches(self, message: str) -> bool:
-        return re.search(self.regex, message, re.IGNORECASE) is not None
+    __pattern__ = r"^dei(ne)? (mudda|mutter|mama)"
+    __tokens__ = ("dei",)
 
-    def get_response(self, chat: Chat, sender: str, message: str) -> str or None:
-        hit = re.search(self.regex, message, re.IGNORECASE)
+    async def get_response(self, member_name: Callable[[], Awaitable[str]], sender: str, message: str) -> str or None:
+        hit = self.compiled_pattern.search(message)
         return f"nee, {hit.group(0)}"
 
 
@@ -118,17 +116,16 @@ class CustomWordAdjectiveRule(ResponseRule):
         "saugeil",
     ]
 
-    def matches(self, message: str) -> bool:
-        return any(map(lambda x: re.search(rf"(^| ){x}( |$)", message, re.IGNORECASE) is not None, self.words))
+    __pattern__ = rf"(^| )({'|'.join(words)})( |$)"
+    __tokens__ = tuple(words)
 
-    def get_response(self, chat: Chat, sender: str, message: str) -> str or None:
+    async def get_response(self, member_name: Callable[[], Awaitable[str]], sender: str, message: str) -> str or None:
         contained_words = self._find_matches(message)
 
         dice = randint(0, 2)
 
         if dice == 0:
-            user = choice(chat.users)
-            return f"{user.first_name}'s mudda is' {' und '.join(contained_words)}"
+            return f"{await member_name()}'s mudda is' {' und '.join(contained_words)}"
         elif dice == 1:
             return "wie deine mudda beim kacken"
         else:
@@ -150,10 +147,9 @@ class CustomWordNounRule(ResponseRule):
         ("kacknase", "ne"),
     ]
 
-    def matches(self, message: str) -> bool:
-        return any(map(lambda x: x[0].lower() in message.lower(), self.words))
+    __pattern__ = "|".join(map(lambda x: re.escape(x[0]), words))
 
-    def get_response(self, chat: Chat, sender: str, message: str) -> str or None:
+    async def get_response(self, member_name: Callable[[], Awaitable[str]], sender: str, message: str) -> str or None:
         contained_words = self._find_matches(message)
 
         suffix = ' und '.join(list(map(lambda x: f"{x[1]} {x[0]}", contained_words)))
@@ -161,8 +157,7 @@ class CustomWordNounRule(ResponseRule):
         dice = randint(0, 1)
 
         if dice == 0:
-            user = choice(chat.users)
-            return f"{user.first_name}'s mudda is' {suffix}"
+            return f"{await member_name()}'s mudda is' {suffix}"
         else:
             return f"deine mudda is' {suffix}"
 
@@ -173,82 +168,63 @@ class CustomWordNounRule(ResponseRule):
 class AdjectiveCounterIntelligenceRule(ResponseRule):
     __description__ = "Adjective counter intelligence"
 
-    match_cache = {}
+    # normalized message -> adjective phrase constituents (empty if there are none, or none we would respond to)
+    match_cache = LruCache("adjp", max_size=DEFAULT_NLP_CACHE_SIZE, ttl=DEFAULT_NLP_CACHE_TTL)
+    # used to skip parsing messages without a relevant adjective
+    lexicon = AdjectiveLexicon(ADJECTIVE_STOP_WORDS)
 
-    def matches(self, message: str) -> bool:
+    analyze = staticmethod(find_adjp)
 
-        if hash(message) in self.match_cache:
-            return True
-
-        constituents = self._find_adpj(message)
-        if len(constituents) > 0 and constituents[-1].lower() not in [
-            "vermutlich",
-            "selbe",
-            "gute",
-            "lieber",
-            "eigentlich",
-            "jam",
-            "neues",
-            "leid",
-            "gleich",
-            "du"
-        ]:
-
-            # cache result
-            self.match_cache[hash(message)] = constituents
-            return True
-        else:
-            return False
+    def configure(self, config: AppConfig):
+        self.match_cache.resize(config.NLP_CACHE_SIZE.value, config.NLP_CACHE_TTL.value)
 
-    def get_response(self, chat: Chat, sender: int, message: str) -> str or None:
-        if hash(message) in self.match_cache:
-            matches = self.match_cache[hash(message)]
-        else:
-            matches = self._find_adpj(message)
+    def warm_up(self):
+        super().warm_up()
+        self.lexicon.adjectives
+
+    def matches(self, message: str) -> bool:
+        constituents = self._find_adpj_cached(message)
+        return len(constituents) > 0 and constituents[-1].lower() not in ADJECTIVE_STOP_WORDS
+
+    async def get_response(self, member_name: Callable[[], Awaitable[str]], sender: int, message: str) -> str or None:
+        matches = self._find_adpj_cached(message)
 
         dice = randint(0, 2)
 
         word_response = " ".join(matches)
 
         if dice == 0:
-            user = choice(chat.users)
-            return f"{user.first_name}'s mudda is' {word_response}"
+            return f"{await member_name()}'s mudda is' {word_response}"
         elif dice == 1:
             return "wie deine mudda beim kacken"
         else:
             return f"deine mudda is' {word_response}"
 
-    def _find_adpj(self, message) -> List[str]:
-        from textblob_de import TextBlobDE as TextBlob
-        blob = TextBlob(message)
-        parsed = blob.parse()
+    def needs_analysis(self, message: str) -> bool:
+        key = self._cache_key(message)
+        if key in self.match_cache:
+            return False
+        if not self._may_match(key):
+            self.match_cache.set(key, [])
+            return False
+        return True
 
-        result = self._extract_adjp(parsed)
-        if result is None:
-            result = []
+    def add_analysis(self, message: str, analysis: List[str]):
+        self.match_cache.set(self._cache_key(message), analysis)
 
+    @staticmethod
+    def _cache_key(message: str) -> str:
+        return " ".join(message.split())
+
+    def _find_adpj_cached(self, message: str) -> List[str]:
+        key = self._cache_key(message)
+        result = self.match_cache.get(key)
+        if result is None:
+            result = self.analyze(key) if self._may_match(key) else []
+            self.match_cache.set(key, result)
         return result
 
-    def _extract_adjp(self, parsed):
-        result = []
-        sentences = parsed.split()
-        for sentence in sentences:
-            for word_tuple in sentence:
-                word = word_tuple[0]
-                if any(map(lambda x: "ADJP" in x, word_tuple[1:])):
-                    result.append(word)
-
-        if len(result) <= 0:
-            return None
-        else:
-            return result
-
-    def _extract_np(self, parsed):
-        result = []
-        sentences = parsed.split()
-        for sentence in sentences:
-            for word_tuple in sentence:
-                word = word_tuple[0]
-                if any(map(lambda x: "-NP" in x, word_tuple[1:])):
-                    result.append(word)
+    def _may_match(self, message: str) -> bool:
+        result = self.lexicon.may_match(message)
+        ADJECTIVE_LEXICON_COUNT.labels(result="parse" if result else "skip").inc()
         return result
@@ -13,10 +13,9 @@
 #  You should have received a copy of the GNU Affero General Public License
 #  along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
-import re
 from random import randint
+from typing import Awaitable, Callable
 
-from deinemudda.persistence import Chat
 from deinemudda.response.rule import ResponseRule
 
 
@@ -25,10 +24,10 @@ class SpongebobRule(ResponseRule):
     __description__ = "Spongebob easter egg"
     __priority__ = 100.0
 
-    def matches(self, message: str) -> bool:
-        return re.search(r"^wer wohnt in ner ananas ganz tief im meer", message, re.IGNORECASE) is not None
+    __pattern__ = r"^wer wohnt in ner ananas ganz tief im meer"
+    __tokens__ = ("wer",)
 
-    def get_response(self, chat: Chat, sender: str, message: str) -> str or None:
+    async def get_response(self, member_name: Callable[[], Awaitable[str]], sender: str, message: str) -> str or None:
         return 'spongebob schwammkopf'
 
 
@@ -37,10 +36,10 @@ class RicolaRule(ResponseRule):
     __description__ = "Ricola easter egg"
     __priority__ = 100.0
 
-    def matches(self, message: str) -> bool:
-        return re.search(r"^wer (hat es|hats) erfunden", message, re.IGNORECASE) is not None
+    __pattern__ = r"^wer (hat es|hats) erfunden"
+    __tokens__ = ("wer",)
 
-    def get_response(self, chat: Chat, sender: str, message: str) -> str or None:
+    async def get_response(self, member_name: Callable[[], Awaitable[str]], sender: str, message: str) -> str or None:
         if randint(0, 3) == 3:
             return 'benjamin oesterle'
         else:
@@ -52,8 +51,8 @@ class GhostbustersRule(ResponseRule):
     __description__ = "Ghostbusters easter egg"
     __priority__ = 100.0
 
-    def matches(self, message: str) -> bool:
-        return re.search(r"^who y(ou|a) gonna call", message, re.IGNORECASE) is not None
+    __pattern__ = r"^who y(ou|a) gonna call"
+    __tokens__ = ("who",)
 
-    def get_response(self, chat: Chat, sender: str, message: str) -> str or None:
+    async def get_response(self, member_name: Callable[[], Awaitable[str]], sender: str, message: str) -> str or None:
         return 'ghostbusters'
@@ -13,7 +13,7 @@
 #  You should have received a copy of the GNU Affero General Public License
 #  along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
-from prometheus_client import Gauge, Summary
+from prometheus_client import Gauge, Summary, Counter, Histogram
 from prometheus_client.metrics import MetricWrapperBase
 
 MESSAGES_COUNT = Gauge('messages_count',
@@ -31,7 +31,75 @@ USERS_IN_CHAT_COUNT = Gauge('users_in_chat',
                             'Number of user entities within the given chat',
                             ['chat_id'])
 
+STARTUP_PHASE_TIME = Gauge('startup_phase_seconds',
+                           'Time spent in the given phase of the startup',
+                           ['phase'])
+
+WRITE_BEHIND_FLUSH_SIZE = Summary('write_behind_flush_size',
+                                  'Number of buffered memberships written by a single flush')
+WRITE_BEHIND_FLUSH_TIME = Summary('write_behind_flush_seconds',
+                                  'Time spent writing buffered memberships to the database')
+WRITE_BEHIND_BUFFER_SIZE = Gauge('write_behind_buffer_size',
+                                 'Number of buffered memberships waiting to be written to the database')
+
 MESSAGE_TIME = Summary('message_processing_seconds', 'Time spent in the messages handler')
+MESSAGE_STAGE_TIME = Summary('message_stage_seconds',
+                             'Time spent in the given stage of message processing',
+                             ['stage'])
+MESSAGE_STAGE_SKIPS_COUNT = Counter('message_stage_skips',
+                                    'Number of messages that did not pass the given stage of message processing',
+                                    ['stage'])
+
+ADJECTIVE_LEXICON_COUNT = Counter('adjective_lexicon',
+                                  'Number of adjective lexicon lookups, by whether the message needs to be parsed',
+                                  ['result'])
+
+RULE_LATENCY_BUCKETS = (.0001, .0005, .001, .005, .01, .05, .1, .5, 1.0, 2.5, float("inf"))
+RULE_MATCH_TIME = Histogram('rule_match_seconds',
+                            'Time spent checking if a rule matches a message, including its analysis',
+                            ['rule'], buckets=RULE_LATENCY_BUCKETS)
+RULE_RESPONSE_TIME = Histogram('rule_response_seconds',
+                               'Time spent creating the response of a rule',
+                               ['rule'], buckets=RULE_LATENCY_BUCKETS)
+RULE_ATTEMPTS_COUNT = Counter('rule_attempts',
+                              'Number of messages a rule was checked against',
+                              ['rule'])
+RULE_HITS_COUNT = Counter('rule_hits',
+                          'Number of messages a rule matched',
+                          ['rule'])
+RULE_NO_RESPONSE_COUNT = Counter('rule_no_responses',
+                                 'Number of messages a rule matched, but did not respond to',
+                                 ['rule'])
+
+WORKER_TASKS_COUNT = Counter('worker_tasks',
+                             'Number of tasks submitted to a worker pool, by result',
+                             ['pool', 'result'])
+WORKER_BATCH_SIZE = Summary('worker_batch_size',
+                            'Number of calls submitted to a worker pool as a single task',
+                            ['pool'])
+
+CACHE_HITS_COUNT = Counter('cache_hits',
+                           'Number of cache lookups that found an entry',
+                           ['cache'])
+CACHE_MISSES_COUNT = Counter('cache_misses',
+                             'Number of cache lookups that did not find an entry',
+                             ['cache'])
+CACHE_EVICTIONS_COUNT = Counter('cache_evictions',
+                                'Number of cache entries removed because of the size or age limit',
+                                ['cache'])
+CACHE_SIZE = Gauge('cache_size',
+                   'Number of entries in the cache',
+                   ['cache'])
+
+RATE_TRACKER_USERS_COUNT = Gauge('rate_tracker_users',
+                                 'Number of users with messages in the time window of the rate tracker',
+                                 ['tracker'])
+RATE_TRACKER_USER_BYTES = Gauge('rate_tracker_user_bytes',
+                                'Approximate memory used by the rate tracker per tracked user',
+                                ['tracker'])
+RATE_TRACKER_SWEEP_TIME = Summary('rate_tracker_sweep_seconds',
+                                  'Time spent removing idle users from the rate tracker',
+                                  ['tracker'])
 
 
 def get_metrics() -> []:
@@ -0,0 +1,220 @@
+#  Copyright (c) 2019 Markus Ressel
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU Affero General Public License as published
+#  by the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU Affero General Public License for more details.
+#
+#  You should have received a copy of the GNU Affero General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import asyncio
+import datetime
+import logging
+import threading
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, List, Tuple
+
+from deinemudda.const import WORKER_TYPE_PROCESS, WORKER_TYPE_THREAD
+from deinemudda.stats import WORKER_TASKS_COUNT, WORKER_BATCH_SIZE
+
+LOGGER = logging.getLogger(__name__)
+LOGGER.setLevel(logging.DEBUG)
+
+
+class WorkerPoolSaturatedError(Exception):
+    """
+    Raised when a task is submitted to a worker pool that has no capacity left
+    """
+    pass
+
+
+def _run_batch(func: Callable, args_list: List[tuple]) -> List[Tuple[Any, Exception or None, float]]:
+    """
+    Calls the given function once for each of the given arguments
+    :param func: the function
+    :param args_list: list of arguments for each call
+    :return: list of (result, exception, CPU time in seconds) tuples, one for each call
+    """
+    results = []
+    for args in args_list:
+        start = time.thread_time()
+        try:
+            result, ex = func(*args), None
+        except Exception as e:
+            result, ex = None, e
+        results.append((result, ex, time.thread_time() - start))
+    return results
+
+
+def _noop():
+    pass
+
+
+class WorkerPool:
+    """
+    Runs blocking functions outside of the asyncio event loop, in a bounded pool of worker threads or processes
+    """
+
+    def __init__(self, name: str, worker_type: str, workers: int, queue_size: int, timeout: datetime.timedelta,
+                 batch_window: datetime.timedelta = datetime.timedelta(0), batch_size: int = 1,
+                 initializer: Callable or None = None):
+        """
+        :param name: name of this pool, used to label its metrics
+        :param worker_type: one of "process" or "thread"
+        :param workers: number of workers
+        :param queue_size: number of tasks that may wait for a free worker, additional tasks are rejected
+        :param timeout: maximum time to wait for the result of a task
+        :param batch_window: maximum time to wait for more calls to add to a batch (see run_batched)
+        :param batch_size: maximum number of calls in a batch (see run_batched)
+        :param initializer: function that is called in every worker when it is started,
+                            must be picklable when using a process pool
+        """
+        self._name = name
+        self._workers = workers
+        self._executor = self._create_executor(worker_type, workers, initializer)
+        self._slots = threading.BoundedSemaphore(workers + queue_size)
+        self._timeout = timeout.total_seconds()
+        self._batch_window = batch_window.total_seconds()
+        self._batch_size = batch_size
+        # function -> list of (arguments, future) of calls waiting for the batch to be submitted
+        self._batches: Dict[Callable, List[Tuple[tuple, asyncio.Future]]] = {}
+        # number of batches that have been submitted and are not done yet
+        self._running_batches = 0
+
+    @staticmethod
+    def _create_executor(worker_type: str, workers: int, initializer: Callable or None) -> Executor:
+        if worker_type == WORKER_TYPE_PROCESS:
+            return ProcessPoolExecutor(max_workers=workers, initializer=initializer)
+        elif worker_type == WORKER_TYPE_THREAD:
+            return ThreadPoolExecutor(max_workers=workers, initializer=initializer)
+        else:
+            raise ValueError(f"Unsupported worker type: {worker_type}")
+
+    def start(self):
+        """
+        Starts all workers (which are otherwise started on demand) and waits until they are initialized
+        """
+        futures = [self._executor.submit(_noop) for _ in range(self._workers)]
+        wait(futures)
+
+    async def run(self, func: Callable, *args) -> Any:
+        """
+        Runs the given function in a worker
+        :param func: the function to run, must be picklable when using a process pool
+        :param args: arguments to pass to the function
+        :return: the result of the function
+        :raises WorkerPoolSaturatedError: if all workers are busy and the queue is full
+        :raises asyncio.TimeoutError: if the result is not available in time
+        """
+        if not self._slots.acquire(blocking=False):
+            WORKER_TASKS_COUNT.labels(pool=self._name, result="rejected").inc()
+            raise WorkerPoolSaturatedError(f"Worker pool {self._name} is saturated")
+
+        try:
+            future = self._executor.submit(func, *args)
+        except:
+            self._slots.release()
+            raise
+        # the slot is kept until the task actually finished, even if we stop waiting for it
+        future.add_done_callback(lambda x: self._slots.release())
+
+        try:
+            result = await asyncio.wait_for(asyncio.wrap_future(future), self._timeout)
+        except asyncio.TimeoutError:
+            WORKER_TASKS_COUNT.labels(pool=self._name, result="timeout").inc()
+            raise
+        except Exception:
+            WORKER_TASKS_COUNT.labels(pool=self._name, result="error").inc()
+            raise
+
+        WORKER_TASKS_COUNT.labels(pool=self._name, result="done").inc()
+        return result
+
+    async def run_batched(self, func: Callable, *args) -> Any:
+        """
+        Runs the given function in a worker, together with other calls of the same function.
+        If a worker is idle, the call is submitted right away. Otherwise, calls are collected until a batch
+        is done, the batch window has passed or the batch size is reached and are then submitted
+        as a single task, to reduce the per task overhead.
+        :param func: the function to run, must be picklable when using a process pool
+        :param args: arguments to pass to the function
+        :return: the result of the function
+        :raises WorkerPoolSaturatedError: if all workers are busy and the queue is full
+        :raises asyncio.TimeoutError: if the result of the batch is not available in time
+        """
+        result, _ = await self.run_batched_timed(func, *args)
+        return result
+
+    async def run_batched_timed(self, func: Callable, *args) -> Tuple[Any, float]:
+        """
+        Like :func:`run_batched`, but also returns the CPU time the call took in the worker
+        :param func: the function to run, must be picklable when using a process pool
+        :param args: arguments to pass to the function
+        :return: the result of the function and its CPU time in seconds
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        batch = self._batches.get(func, None)
+        if batch is None and self._running_batches < self._workers:
+            # waiting for more calls would only add latency
+            batch = [(args, future)]
+            self._start_batch(func, batch)
+            return await future
+        if batch is None:
+            batch = []
+            self._batches[func] = batch
+            loop.call_later(self._batch_window, self._submit_batch, func, batch)
+        batch.append((args, future))
+        if len(batch) >= self._batch_size:
+            self._submit_batch(func, batch)
+
+        return await future
+
+    def _submit_batch(self, func: Callable, batch: List[Tuple[tuple, asyncio.Future]]):
+        if self._batches.get(func, None) is not batch:
+            # already submitted
+            return
+        del self._batches[func]
+        self._start_batch(func, batch)
+
+    def _start_batch(self, func: Callable, batch: List[Tuple[tuple, asyncio.Future]]):
+        self._running_batches += 1
+        asyncio.ensure_future(self._run_batch(func, batch))
+
+    async def _run_batch(self, func: Callable, batch: List[Tuple[tuple, asyncio.Future]]):
+        WORKER_BATCH_SIZE.labels(pool=self._name).observe(len(batch))
+        try:
+            results = await self.run(_run_batch, func, list(map(lambda x: x[0], batch)))
+        except Exception as ex:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(ex)
+            return
+        finally:
+            self._running_batches -= 1
+            # a worker is available, calls that have been collected in the meantime do not have to wait any longer
+            for waiting_func, waiting_batch in list(self._batches.items()):
+                self._submit_batch(waiting_func, waiting_batch)
+
+        for (_, future), (result, ex, cpu_time) in zip(batch, results):
+            if future.done():
+                # the caller is not waiting anymore
+                continue
+            if ex is not None:
+                future.set_exception(ex)
+            else:
+                future.set_result((result, cpu_time))
+
+    def shutdown(self):
+        """
+        Stops all workers, discarding queued tasks
+        """
+        self._executor.shutdown(wait=False, cancel_futures=True)
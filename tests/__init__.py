@@ -14,7 +14,6 @@
 #  along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
 import unittest
-from types import SimpleNamespace
 from typing import List
 
 from deinemudda.response import ResponseRule, ResponseManager
@@ -22,7 +21,10 @@ from deinemudda.response import ResponseRule, ResponseManager
 
 class TestBase(unittest.TestCase):
     all_rules: List[ResponseRule] = ResponseManager._find_rules()
-    dummy_chat = SimpleNamespace(users=[SimpleNamespace(first_name="markus")])
+    dummy_member_name = "markus"
+
+    async def sample_dummy_member_name(self) -> str:
+        return self.dummy_member_name
 
     def setUp(self):
         pass
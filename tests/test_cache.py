@@ -0,0 +1,66 @@
+#  Copyright (c) 2019 Markus Ressel
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU Affero General Public License as published
+#  by the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU Affero General Public License for more details.
+#
+#  You should have received a copy of the GNU Affero General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import datetime
+from unittest import mock
+
+from deinemudda.cache import LruCache
+from deinemudda.stats import CACHE_EVICTIONS_COUNT, CACHE_HITS_COUNT, CACHE_MISSES_COUNT, CACHE_SIZE
+from tests import TestBase
+
+
+class LruCacheTest(TestBase):
+
+    def test_least_recently_used_entry_is_evicted(self):
+        cache = LruCache("test_lru", max_size=2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        self.assertEqual(1, cache.get("a"))
+        cache.set("c", 3)
+
+        self.assertEqual(2, len(cache))
+        self.assertEqual(1, cache.get("a"))
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(3, cache.get("c"))
+
+    def test_falsy_values_are_cached(self):
+        cache = LruCache("test_falsy", max_size=2)
+        cache.set("a", [])
+        self.assertEqual([], cache.get("a"))
+
+    def test_expired_entries_are_evicted(self):
+        cache = LruCache("test_ttl", max_size=10, ttl=datetime.timedelta(seconds=10))
+        with mock.patch("deinemudda.cache.time.monotonic", return_value=100):
+            cache.set("a", 1)
+            cache.set("b", 2)
+        with mock.patch("deinemudda.cache.time.monotonic", return_value=105):
+            self.assertEqual(1, cache.get("a"))
+        with mock.patch("deinemudda.cache.time.monotonic", return_value=111):
+            self.assertIsNone(cache.get("a"))
+            cache.set("c", 3)
+
+        self.assertEqual(1, len(cache))
+
+    def test_metrics(self):
+        cache = LruCache("test_metrics", max_size=1)
+        cache.set("a", 1)
+        cache.get("a")
+        cache.get("b")
+        cache.set("b", 2)
+
+        self.assertEqual(1, CACHE_HITS_COUNT.labels(cache="test_metrics")._value.get())
+        self.assertEqual(1, CACHE_MISSES_COUNT.labels(cache="test_metrics")._value.get())
+        self.assertEqual(1, CACHE_EVICTIONS_COUNT.labels(cache="test_metrics")._value.get())
+        self.assertEqual(1, CACHE_SIZE.labels(cache="test_metrics")._value.get())
@@ -0,0 +1,631 @@
+#  Copyright (c) 2019 Markus Ressel
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU Affero General Public License as published
+#  by the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU Affero General Public License for more details.
+#
+#  You should have received a copy of the GNU Affero General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import asyncio
+import datetime
+import threading
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+from types import SimpleNamespace
+from unittest import mock
+
+from alembic.autogenerate import compare_metadata
+from alembic.migration import MigrationContext
+from sqlalchemy import create_engine, event, inspect
+
+from deinemudda.const import SETTINGS_TRIGGER_PROBABILITY_KEY, SETTINGS_ANTISPAM_ENABLED_KEY
+from deinemudda.persistence import Persistence, Chat, UserState, DEFAULT_USER_STATE, PROJECT_DIR, SCHEMA_REVISION, \
+    SchemaOutdatedError
+from deinemudda.persistence.entity import Base
+from deinemudda.persistence.entity.chat import Setting
+from deinemudda.persistence.members import MemberNames
+from deinemudda.persistence.async_persistence import AsyncPersistence
+from deinemudda.stats import CACHE_MISSES_COUNT, ENTITIES_COUNT, USERS_IN_CHAT_COUNT
+from tests import TestBase
+
+
+class PersistenceTestBase(TestBase):
+    write_behind = False
+    sqlite_tuned = False
+
+    def setUp(self):
+        self._directory = tempfile.TemporaryDirectory()
+        self.config = SimpleNamespace(
+            SQL_PERSISTENCE_URL=SimpleNamespace(value=f"sqlite:///{os.path.join(self._directory.name, 'test.db')}"),
+            PERSISTENCE_CHAT_CACHE_SIZE=SimpleNamespace(value=100),
+            PERSISTENCE_STATS_INTERVAL=SimpleNamespace(value=datetime.timedelta(hours=1)),
+            PERSISTENCE_WRITE_BEHIND=SimpleNamespace(value=self.write_behind),
+            PERSISTENCE_FLUSH_INTERVAL=SimpleNamespace(value=datetime.timedelta(hours=1)),
+            PERSISTENCE_FLUSH_SIZE=SimpleNamespace(value=3),
+            PERSISTENCE_POOL_SIZE=SimpleNamespace(value=2),
+            PERSISTENCE_POOL_MAX_OVERFLOW=SimpleNamespace(value=2),
+            PERSISTENCE_POOL_PRE_PING=SimpleNamespace(value=False),
+            PERSISTENCE_POOL_RECYCLE=SimpleNamespace(value=datetime.timedelta(0)),
+            PERSISTENCE_SQLITE_TUNED=SimpleNamespace(value=self.sqlite_tuned),
+            PERSISTENCE_AUTO_MIGRATE=SimpleNamespace(value=True),
+        )
+        self.persistence = Persistence(self.config)
+
+    def tearDown(self):
+        self.persistence.close()
+        self._directory.cleanup()
+
+    @contextmanager
+    def count_queries(self):
+        """
+        Counts the SQL statements executed within this context
+        """
+        statements = []
+
+        def before_cursor_execute(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        event.listen(self.persistence._engine, "before_cursor_execute", before_cursor_execute)
+        try:
+            yield statements
+        finally:
+            event.remove(self.persistence._engine, "before_cursor_execute", before_cursor_execute)
+
+    def _pragma(self, key: str):
+        with self.persistence._engine.connect() as connection:
+            return connection.exec_driver_sql(f"PRAGMA {key}").scalar()
+
+    @staticmethod
+    def telegram_user(user_id: int, first_name: str = "markus"):
+        return SimpleNamespace(id=user_id, first_name=first_name, full_name=f"{first_name} ressel",
+                               username=f"{first_name}_{user_id}")
+
+
+class PersistenceTest(PersistenceTestBase):
+
+    def test_chat_is_cached(self):
+        self.persistence.add_or_update_chat(Chat(id=1, type="group"))
+
+        with self.count_queries() as statements:
+            chat = self.persistence.get_chat(1)
+            self.persistence.get_chat(1)
+
+        self.assertEqual(1, chat.id)
+        self.assertEqual([], statements)
+
+    def test_cache_is_written_through(self):
+        self.persistence.add_or_update_chat(Chat(id=1, type="group"))
+        self.persistence.add_or_update_chat_member(self.persistence.get_chat(1), self.telegram_user(2))
+        chat = self.persistence.get_chat(1)
+        chat.set_setting("key", "value")
+        self.persistence.add_or_update_chat(chat)
+
+        with self.count_queries() as statements:
+            chat = self.persistence.get_chat(1)
+        self.assertEqual([], statements)
+        self.assertEqual([2], list(map(lambda x: x.id, chat.users)))
+        self.assertEqual("value", chat.get_setting("key", default=None))
+
+        # the database contains the same state
+        self.persistence._chat_cache.clear()
+        chat = self.persistence.get_chat(1)
+        self.assertEqual([2], list(map(lambda x: x.id, chat.users)))
+        self.assertEqual("value", chat.get_setting("key", default=None))
+
+    def test_update_with_new_chat_entity_keeps_members_and_other_settings(self):
+        chat = Chat(id=1, type="group")
+        chat.set_setting(SETTINGS_ANTISPAM_ENABLED_KEY, "off")
+        self.persistence.add_or_update_chat(chat)
+        self.persistence.add_or_update_chat_member(self.persistence.get_chat(1), self.telegram_user(2))
+
+        chat = Chat(id=1, type="group")
+        chat.set_setting(SETTINGS_TRIGGER_PROBABILITY_KEY, "0.5")
+        self.persistence.add_or_update_chat(chat)
+
+        settings = self.persistence.get_chat_settings(1)
+        self.assertEqual(0.5, settings.trigger_probability)
+        self.assertFalse(settings.antispam_enabled)
+        self.assertEqual([2], list(map(lambda x: x.id, self.persistence.get_chat(1).users)))
+
+    def test_deleted_chat_is_evicted(self):
+        self.persistence.add_or_update_chat(Chat(id=1, type="group"))
+        self.persistence.get_chat(1)
+        self.persistence.delete_chat(1)
+
+        self.assertIsNone(self.persistence.get_chat(1))
+
+    def test_deleted_chat_removes_orphans(self):
+        chat = Chat(id=1, type="group")
+        chat.set_setting("key", "value")
+        self.persistence.add_or_update_chat(chat)
+        self.persistence.add_or_update_chat(Chat(id=2, type="group"))
+        for user_id in [3, 4, 5]:
+            self.persistence.add_or_update_chat_member(self.persistence.get_chat(1), self.telegram_user(user_id))
+        self.persistence.add_or_update_chat_member(self.persistence.get_chat(2), self.telegram_user(3))
+
+        with self.count_queries() as statements:
+            self.persistence.delete_chat(1)
+
+        # select orphans, delete memberships, settings, chat and orphans
+        self.assertEqual(5, len(statements))
+        self.assertIsNotNone(self.persistence.get_user(3))
+        self.assertIsNone(self.persistence.get_user(4))
+        self.assertIsNone(self.persistence.get_user(5))
+        self.assertEqual([3], list(map(lambda x: x.id, self.persistence.get_chat(2).users)))
+        self.assertEqual(0, self.persistence.get_member_count(1))
+        with self.persistence._session_scope() as session:
+            self.assertEqual(0, session.query(Setting).count())
+
+    def test_deleted_chat_keeps_unrelated_users(self):
+        self.persistence.add_or_update_chat(Chat(id=1, type="group"))
+        self.persistence.add_or_update_chat(Chat(id=2, type="group"))
+        self.persistence.add_or_update_chat_member(self.persistence.get_chat(1), self.telegram_user(10))
+        self.persistence.add_or_update_chat_member(self.persistence.get_chat(2), self.telegram_user(11))
+        self.persistence.preload_user_states()
+        self.persistence.set_user_banned(10, True)
+        # user 10 is not a member of any chat afterwards
+        self.persistence.remove_chat_member(1, 10)
+
+        self.persistence.delete_chat(2)
+
+        self.assertIsNotNone(self.persistence.get_user(10))
+        self.assertIsNone(self.persistence.get_user(11))
+        self.assertTrue(self.persistence.get_cached_user_state(10).is_banned)
+        self.assertTrue(self.persistence.get_user_state(10).is_banned)
+
+    def test_stats_are_updated_incrementally(self):
+        def stats():
+            return (ENTITIES_COUNT.labels(type="chat")._value.get(),
+                    ENTITIES_COUNT.labels(type="user")._value.get(),
+                    USERS_IN_CHAT_COUNT.labels(chat_id=1)._value.get())
+
+        self.persistence.add_or_update_chat(Chat(id=1, type="group"))
+        self.persistence.add_or_update_chat(Chat(id=2, type="group"))
+        for user_id in [1, 2, 3]:
+            self.persistence.add_or_update_chat_member(self.persistence.get_chat(1), self.telegram_user(user_id))
+        self.persistence.add_or_update_chat_member(self.persistence.get_chat(2), self.telegram_user(1))
+        self.persistence.add_or_update_chat_member(self.persistence.get_chat(1), self.telegram_user(1, "other"))
+        self.persistence.delete_chat(2)
+
+        self.assertEqual((1, 3, 3), stats())
+        self.persistence._reconcile_stats()
+        self.assertEqual((1, 3, 3), stats())
+
+    def test_chat_settings_are_loaded_without_chat(self):
+        chat = Chat(id=1, type="group")
+        chat.set_setting(SETTINGS_TRIGGER_PROBABILITY_KEY, "0.5")
+        self.persistence.add_or_update_chat(chat)
+        self.persistence.add_or_update_chat(Chat(id=2, type="group"))
+        self.persistence._chat_cache.clear()
+        self.persistence._chat_settings.clear()
+
+        with self.count_queries() as statements:
+            self.assertEqual(0.5, self.persistence.get_chat_settings(1).trigger_probability)
+            self.assertEqual(0.01, self.persistence.get_chat_settings(2).trigger_probability)
+            self.assertIsNone(self.persistence.get_chat_settings(3))
+            # cached
+            self.persistence.get_chat_settings(1)
+        self.assertEqual(3, len(statements))
+        self.assertNotIn(1, self.persistence._chat_cache)
+
+    def test_chat_settings_are_written_through(self):
+        self.persistence.add_or_update_chat(Chat(id=1, type="group"))
+        self.assertTrue(self.persistence.get_chat_settings(1).antispam_enabled)
+
+        chat = self.persistence.get_chat(1)
+        chat.set_setting(SETTINGS_ANTISPAM_ENABLED_KEY, "off")
+        chat.set_setting(SETTINGS_TRIGGER_PROBABILITY_KEY, "0.2")
+        self.persistence.add_or_update_chat(chat)
+
+        with self.count_queries() as statements:
+            settings = self.persistence.get_chat_settings(1)
+        self.assertEqual([], statements)
+        self.assertFalse(settings.antispam_enabled)
+        self.assertEqual(0.2, settings.trigger_probability)
+
+        self.persistence.delete_chat(1)
+        self.assertIsNone(self.persistence.get_chat_settings(1))
+
+    def test_chat_settings_are_preloaded(self):
+        for chat_id in [1, 2, 3]:
+            chat = Chat(id=chat_id, type="group")
+            chat.set_setting(SETTINGS_TRIGGER_PROBABILITY_KEY, f"0.{chat_id}")
+            self.persistence.add_or_update_chat(chat)
+        self.persistence._chat_cache.clear()
+        self.persistence._chat_settings.clear()
+
+        with self.count_queries() as statements:
+            self.assertEqual(3, self.persistence.preload_chat_settings())
+            probabilities = list(map(lambda x: self.persistence.get_chat_settings(x).trigger_probability, [1, 2, 3]))
+        self.assertEqual(1, len(statements))
+        self.assertEqual([0.1, 0.2, 0.3], probabilities)
+
+    def test_loading_a_chat_does_not_load_other_chats(self):
+        for chat_id in [1, 2]:
+            self.persistence.add_or_update_chat(Chat(id=chat_id, type="group"))
+            self.persistence.add_or_update_chat_member(self.persistence.get_chat(chat_id), self.telegram_user(3))
+        self.persistence._chat_cache.clear()
+
+        with self.count_queries() as statements:
+            chat = self.persistence.get_chat(1)
+        # chat, users, settings
+        self.assertEqual(3, len(statements))
+        self.assertNotIn("chats", inspect(chat.users[0]).dict)
+
+    def test_user_state(self):
+        self.persistence.add_or_update_chat(Chat(id=1, type="group"))
+        self.persistence.add_or_update_chat_member(self.persistence.get_chat(1), self.telegram_user(2))
+        self.assertEqual(UserState(is_banned=False, last_timeout=None), self.persistence.get_user_state(2))
+        self.assertIsNone(self.persistence.get_user_state(3))
+
+        timeout = datetime.datetime(2019, 1, 1)
+        self.persistence.get_chat(1)
+        self.persistence.set_user_banned(2, True)
+        self.persistence.set_user_timeout(2, timeout)
+
+        self.assertEqual(UserState(is_banned=True, last_timeout=timeout), self.persistence.get_user_state(2))
+        # cached chats are not evicted by antispam changes
+        self.assertIsNotNone(self.persistence.get_cached_chat(1))
+
+    def test_user_states_are_preloaded_and_written_through(self):
+        self.persistence.add_or_update_chat(Chat(id=1, type="group"))
+        for user_id in [2, 3, 4]:
+            self.persistence.add_or_update_chat_member(self.persistence.get_chat(1), self.telegram_user(user_id))
+        timeout = datetime.datetime(2019, 1, 1)
+        self.persistence.set_user_banned(2, True)
+        self.persistence.set_user_timeout(3, timeout)
+        self.assertIsNone(self.persistence.get_cached_user_state(2))
+
+        with self.count_queries() as statements:
+            self.assertEqual(2, self.persistence.preload_user_states())
+            states = list(map(self.persistence.get_cached_user_state, [2, 3, 4, 5]))
+        self.assertEqual(1, len(statements))
+        self.assertEqual([UserState(is_banned=True, last_timeout=None),
+                          UserState(is_banned=False, last_timeout=timeout),
+                          DEFAULT_USER_STATE, DEFAULT_USER_STATE], states)
+
+        self.persistence.set_user_banned(2, False)
+        self.persistence.set_user_timeout(4, timeout)
+        user = self.persistence.get_user(3)
+        user.is_banned = True
+        self.persistence.add_or_update_user(user)
+        self.assertEqual([DEFAULT_USER_STATE, UserState(is_banned=True, last_timeout=timeout),
+                          UserState(is_banned=False, last_timeout=timeout)],
+                         list(map(self.persistence.get_cached_user_state, [2, 3, 4])))
+        self.assertEqual(list(map(self.persistence.get_user_state, [2, 3, 4])),
+                         list(map(self.persistence.get_cached_user_state, [2, 3, 4])))
+        self.assertNotIn(2, self.persistence._user_states)
+
+    def test_deleted_users_are_removed_from_user_states(self):
+        self.persistence.add_or_update_chat(Chat(id=1, type="group"))
+        self.persistence.add_or_update_chat_member(self.persistence.get_chat(1), self.telegram_user(2))
+        self.persistence.preload_user_states()
+        self.persistence.set_user_banned(2, True)
+
+        self.persistence.delete_chat(1)
+        self.assertEqual(DEFAULT_USER_STATE, self.persistence.get_cached_user_state(2))
+        self.assertNotIn(2, self.persistence._user_states)
+
+    def test_member_count(self):
+        self.persistence.add_or_update_chat(Chat(id=1, type="group"))
+        for user_id in [2, 3]:
+            self.persistence.add_or_update_chat_member(self.persistence.get_chat(1), self.telegram_user(user_id))
+
+        self.assertEqual(2, self.persistence.get_member_count(1))
+        self.assertEqual(0, self.persistence.get_member_count(2))
+
+    def test_member_name_is_sampled_from_cache(self):
+        self.persistence.add_or_update_chat(Chat(id=1, type="group"))
+        self.persistence.add_or_update_chat_member(self.persistence.get_chat(1), self.telegram_user(2, "markus"))
+        self.persistence.add_or_update_chat_member(self.persistence.get_chat(1), self.telegram_user(3, "max"))
+
+        with self.count_queries() as statements:
+            names = set(map(lambda x: self.persistence.sample_member_name(1), range(50)))
+        self.assertEqual([], statements)
+        self.assertEqual({"markus", "max"}, names)
+
+        # a member left
+        with self.count_queries() as statements:
+            self.persistence.remove_chat_member(1, 3)
+            self.assertEqual("markus", self.persistence.sample_member_name(1))
+        self.assertEqual(1, len(statements))
+        self.assertEqual([2], list(map(lambda x: x.id, self.persistence.get_chat(1).users)))
+        self.assertEqual(1, self.persistence.get_member_count(1))
+
+    def test_member_name_of_cold_chat_is_sampled_in_database(self):
+        self.persistence.add_or_update_chat(Chat(id=1, type="group"))
+        self.persistence.add_or_update_chat_member(self.persistence.get_chat(1), self.telegram_user(2, "markus"))
+        self.persistence._chat_cache.clear()
+        self.persistence._member_names.clear()
+
+        with self.count_queries() as statements:
+            self.assertEqual("markus", self.persistence.sample_member_name(1))
+            self.assertIsNone(self.persistence.sample_member_name(2))
+        self.assertEqual(2, len(statements))
+
+    def test_member_names(self):
+        names = MemberNames({1: "markus", 2: "max"})
+        names.set(3, "moritz")
+        names.set(1, "other")
+        names.remove(2)
+        names.remove(4)
+
+        self.assertEqual(2, len(names))
+        self.assertEqual({"other", "moritz"}, set(map(lambda x: names.sample(), range(50))))
+        names.remove(1)
+        names.remove(3)
+        self.assertIsNone(names.sample())
+
+    def test_schema_at_head_is_not_migrated(self):
+        self.persistence.close()
+        with mock.patch.object(Persistence, "migrate") as migrate:
+            self.persistence = Persistence(self.config)
+        migrate.assert_not_called()
+
+    def test_outdated_schema_without_auto_migrate(self):
+        config = SimpleNamespace(**vars(self.config))
+        config.SQL_PERSISTENCE_URL = SimpleNamespace(value=f"sqlite:///{os.path.join(self._directory.name, 'new.db')}")
+        config.PERSISTENCE_AUTO_MIGRATE = SimpleNamespace(value=False)
+
+        with self.assertRaises(SchemaOutdatedError):
+            Persistence(config)
+
+    def test_sqlite_is_not_tuned_by_default(self):
+        self.assertEqual("delete", self._pragma("journal_mode"))
+
+    def test_known_member_is_not_written_again(self):
+        self.persistence.add_or_update_chat(Chat(id=1, type="group"))
+        self.persistence.add_or_update_chat_member(self.persistence.get_chat(1), self.telegram_user(2))
+        chat = self.persistence.get_chat(1)
+
+        with self.count_queries() as statements:
+            self.persistence.add_or_update_chat_member(chat, self.telegram_user(2))
+        self.assertEqual([], statements)
+
+    def test_changed_member_profile_is_written(self):
+        self.persistence.add_or_update_chat(Chat(id=1, type="group"))
+        self.persistence.add_or_update_chat_member(self.persistence.get_chat(1), self.telegram_user(2))
+        self.persistence.add_or_update_chat_member(self.persistence.get_chat(1), self.telegram_user(2, "other"))
+
+        chat = self.persistence.get_chat(1)
+        self.assertEqual(["other"], list(map(lambda x: x.first_name, chat.users)))
+        self.assertEqual("other", self.persistence.get_user(2).first_name)
+
+    def test_changed_member_profile_only_evicts_chats_of_member(self):
+        for chat_id in [1, 2, 3]:
+            self.persistence.add_or_update_chat(Chat(id=chat_id, type="group"))
+        for chat_id in [1, 2]:
+            self.persistence.add_or_update_chat_member(self.persistence.get_chat(chat_id), self.telegram_user(2))
+        self.persistence.add_or_update_chat_member(self.persistence.get_chat(3), self.telegram_user(3))
+        for chat_id in [1, 2, 3]:
+            self.persistence.get_chat(chat_id)
+
+        self.persistence.add_or_update_chat_member(self.persistence.get_chat(1), self.telegram_user(2, "other"))
+
+        self.assertIsNone(self.persistence.get_cached_chat(1))
+        self.assertIsNone(self.persistence.get_cached_chat(2))
+        self.assertIsNotNone(self.persistence.get_cached_chat(3))
+        # updated in place
+        self.assertEqual("other", self.persistence.sample_cached_member_name(2))
+        self.assertEqual("markus", self.persistence.sample_cached_member_name(3))
+        self.assertEqual(["other"], list(map(lambda x: x.first_name, self.persistence.get_chat(2).users)))
+
+
+    def test_new_member_is_added_to_cached_chat(self):
+        self.persistence.add_or_update_chat(Chat(id=1, type="group"))
+        self.persistence.add_or_update_chat_member(self.persistence.get_chat(1), self.telegram_user(2))
+        self.persistence.add_or_update_chat_member(self.persistence.get_chat(1), self.telegram_user(3))
+
+        with self.count_queries() as statements:
+            chat = self.persistence.get_chat(1)
+        self.assertEqual(0, len(statements))
+        self.assertEqual([2, 3], sorted(map(lambda x: x.id, chat.users)))
+
+
+class WriteBehindPersistenceTest(PersistenceTestBase):
+    write_behind = True
+
+    def _member_ids(self, chat_id: int):
+        self.persistence._chat_cache.clear()
+        return sorted(map(lambda x: x.id, self.persistence.get_chat(chat_id).users))
+
+    def test_members_are_written_on_flush(self):
+        self.persistence.add_or_update_chat(Chat(id=1, type="group"))
+        self.persistence.add_or_update_chat_member(self.persistence.get_chat(1), self.telegram_user(2))
+        self.persistence.add_or_update_chat_member(self.persistence.get_chat(1), self.telegram_user(2, "other"))
+        self.assertEqual([], self._member_ids(1))
+
+        with self.count_queries() as statements:
+            self.persistence.flush()
+        # a single transaction: select users, insert users, select members, insert members
+        self.assertEqual(4, len(statements))
+
+        self.assertEqual([2], self._member_ids(1))
+        self.assertEqual("other", self.persistence.get_user(2).first_name)
+
+    def test_flushed_members_are_added_to_cached_chat(self):
+        self.persistence.add_or_update_chat(Chat(id=1, type="group"))
+        self.persistence.add_or_update_chat_member(self.persistence.get_chat(1), self.telegram_user(2))
+        self.persistence.flush()
+
+        with self.count_queries() as statements:
+            chat = self.persistence.get_chat(1)
+        self.assertEqual(0, len(statements))
+        self.assertEqual([2], list(map(lambda x: x.id, chat.users)))
+
+    def test_full_buffer_is_flushed_by_background_thread(self):
+        self.persistence.add_or_update_chat(Chat(id=1, type="group"))
+        for user_id in [1, 2, 3]:
+            self.persistence.add_or_update_chat_member(self.persistence.get_chat(1), self.telegram_user(user_id))
+
+        for _ in range(100):
+            if len(self.persistence._pending_memberships) <= 0:
+                break
+            time.sleep(0.01)
+        self.persistence._flush_lock.acquire()
+        self.persistence._flush_lock.release()
+
+        self.assertEqual([1, 2, 3], self._member_ids(1))
+
+    def test_buffer_is_written_before_chat_changes(self):
+        self.persistence.add_or_update_chat(Chat(id=1, type="group"))
+        self.persistence.add_or_update_chat_member(self.persistence.get_chat(1), self.telegram_user(2))
+
+        # the member leaves the chat, which must not be undone by the buffered membership
+        self.persistence.remove_chat_member(1, 2)
+        self.persistence.flush()
+
+        self.assertEqual([], self._member_ids(1))
+
+    def test_setting_change_keeps_buffered_members(self):
+        self.persistence.add_or_update_chat(Chat(id=1, type="group"))
+        for user_id in [2, 3]:
+            self.persistence.add_or_update_chat_member(self.persistence.get_chat(1), self.telegram_user(user_id))
+
+        chat = self.persistence.get_chat(1)
+        chat.set_setting(SETTINGS_TRIGGER_PROBABILITY_KEY, "0.5")
+        self.persistence.add_or_update_chat(chat)
+
+        self.assertEqual(2, self.persistence.get_member_count(1))
+        self.assertEqual([2, 3], sorted(map(lambda x: x.id, self.persistence.get_chat(1).users)))
+        self.assertEqual(0.5, self.persistence.get_chat_settings(1).trigger_probability)
+
+    def test_buffer_is_written_on_close(self):
+        self.persistence.add_or_update_chat(Chat(id=1, type="group"))
+        self.persistence.add_or_update_chat_member(self.persistence.get_chat(1), self.telegram_user(2))
+        self.persistence.close()
+
+        self.persistence = Persistence(self.config)
+        self.assertEqual([2], self._member_ids(1))
+
+
+class TunedSqlitePersistenceTest(PersistenceTestBase):
+    sqlite_tuned = True
+
+    def test_pragmas_are_applied(self):
+        self.assertEqual("wal", self._pragma("journal_mode"))
+        self.assertEqual(1, self._pragma("synchronous"))
+        self.assertEqual(5000, self._pragma("busy_timeout"))
+        self.assertEqual(-64 * 1024, self._pragma("cache_size"))
+
+    def test_members_are_written(self):
+        self.persistence.add_or_update_chat(Chat(id=1, type="group"))
+        self.persistence.add_or_update_chat_member(self.persistence.get_chat(1), self.telegram_user(2))
+
+        self.persistence._chat_cache.clear()
+        self.assertEqual([2], list(map(lambda x: x.id, self.persistence.get_chat(1).users)))
+
+
+class AsyncPersistenceTest(PersistenceTestBase):
+
+    def setUp(self):
+        super().setUp()
+        self.async_persistence = AsyncPersistence(self.persistence)
+
+    def tearDown(self):
+        self.async_persistence.shutdown()
+        super().tearDown()
+
+    def test_database_is_accessed_outside_of_event_loop(self):
+        threads = []
+        event.listen(self.persistence._engine, "before_cursor_execute",
+                     lambda *args: threads.append(threading.current_thread()))
+
+        async def run():
+            await self.async_persistence.add_or_update_chat(Chat(id=1, type="group"))
+            chat = await self.async_persistence.get_chat(1)
+            await self.async_persistence.add_or_update_chat_member(chat, self.telegram_user(2))
+            user = await self.async_persistence.get_user(2)
+            return await self.async_persistence.get_chat(1), user
+
+        chat, user = asyncio.run(run())
+
+        self.assertEqual([2], list(map(lambda x: x.id, chat.users)))
+        self.assertEqual("markus_2", user.username)
+        self.assertNotEqual([], threads)
+        self.assertNotIn(threading.current_thread(), threads)
+
+    def test_preloaded_user_state_does_not_access_database(self):
+        self.persistence.add_or_update_chat(Chat(id=1, type="group"))
+        self.persistence.add_or_update_chat_member(self.persistence.get_chat(1), self.telegram_user(2))
+        self.persistence.set_user_banned(2, True)
+        self.persistence.preload_user_states()
+
+        with self.count_queries() as statements:
+            states = asyncio.run(self.async_persistence.get_user_state(2)), \
+                     asyncio.run(self.async_persistence.get_user_state(3))
+        self.assertEqual([], statements)
+        self.assertEqual((UserState(is_banned=True, last_timeout=None), DEFAULT_USER_STATE), states)
+
+
+    def test_cold_lookups_count_a_single_miss(self):
+        self.persistence.add_or_update_chat(Chat(id=1, type="group"))
+        self.persistence.add_or_update_chat_member(self.persistence.get_chat(1), self.telegram_user(2))
+        for cache in [self.persistence._chat_cache, self.persistence._chat_settings, self.persistence._member_names]:
+            cache.clear()
+
+        def misses():
+            return list(map(lambda x: CACHE_MISSES_COUNT.labels(cache=x)._value.get(),
+                            ["chat", "chat_settings", "member_names"]))
+
+        async def run():
+            await self.async_persistence.sample_member_name(1)
+            await self.async_persistence.get_chat_settings(1)
+            await self.async_persistence.get_chat(1)
+
+        before = misses()
+        asyncio.run(run())
+        # the settings lookup checks the chat cache too
+        self.assertEqual([before[0] + 2, before[1] + 1, before[2] + 1], misses())
+
+
+class MigrationTest(TestBase):
+
+    def setUp(self):
+        self._directory = tempfile.TemporaryDirectory()
+        self.url = f"sqlite:///{os.path.join(self._directory.name, 'test.db')}"
+
+    def tearDown(self):
+        self._directory.cleanup()
+
+    def _migrate(self, revision: str):
+        import alembic.command
+        alembic.command.upgrade(self._alembic_config(), revision)
+
+    def _alembic_config(self):
+        from alembic.config import Config
+        config = Config(os.path.join(PROJECT_DIR, 'alembic.ini'))
+        config.set_main_option('script_location', os.path.join(PROJECT_DIR, 'alembic'))
+        config.set_main_option('sqlalchemy.url', self.url)
+        config.attributes['configure_logger'] = False
+        return config
+
+    def test_schema_revision_is_head(self):
+        from alembic.script import ScriptDirectory
+        self.assertEqual(ScriptDirectory.from_config(self._alembic_config()).get_current_head(), SCHEMA_REVISION)
+
+    def test_association_primary_key_removes_duplicates(self):
+        self._migrate('bf2fd1c9ee8d')
+        engine = create_engine(self.url)
+        with engine.begin() as connection:
+            connection.exec_driver_sql("INSERT INTO chats (id, type) VALUES (1, 'group')")
+            connection.exec_driver_sql("INSERT INTO users (id, username) VALUES (2, 'markus'), (3, 'max')")
+            connection.exec_driver_sql(
+                "INSERT INTO association (chat_id, user_id) VALUES (1, 2), (1, 2), (1, 3), (1, NULL)")
+
+        self._migrate('head')
+
+        with engine.connect() as connection:
+            rows = connection.exec_driver_sql("SELECT chat_id, user_id FROM association ORDER BY user_id").all()
+            self.assertEqual([(1, 2), (1, 3)], list(map(tuple, rows)))
+            self.assertEqual([], compare_metadata(MigrationContext.configure(connection), Base.metadata))
+        engine.dispose()
@@ -0,0 +1,67 @@
+#  Copyright (c) 2019 Markus Ressel
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU Affero General Public License as published
+#  by the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU Affero General Public License for more details.
+#
+#  You should have received a copy of the GNU Affero General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from unittest import mock
+
+from deinemudda.ratelimit import MessageRateTracker
+from deinemudda.stats import RATE_TRACKER_USERS_COUNT, RATE_TRACKER_USER_BYTES
+from tests import TestBase
+
+
+class MessageRateTrackerTest(TestBase):
+
+    def setUp(self):
+        self.now = 1000.0
+        patcher = mock.patch("deinemudda.ratelimit.time.monotonic", lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_messages_within_window_are_counted(self):
+        tracker = MessageRateTracker("test_window", window=30, max_messages=5)
+        self.assertEqual(0, tracker.count(1))
+        self.assertEqual(1, tracker.add(1))
+        self.now += 10
+        self.assertEqual(2, tracker.add(1))
+        self.assertEqual(1, tracker.add(2))
+
+        self.now += 25
+        self.assertEqual(1, tracker.count(1))
+        self.assertEqual(2, tracker.add(1))
+
+    def test_count_is_limited_by_ring_buffer_size(self):
+        tracker = MessageRateTracker("test_limit", window=30, max_messages=3)
+        counts = list(map(lambda x: tracker.add(1), range(10)))
+        self.assertEqual([1, 2, 3, 3, 3, 3, 3, 3, 3, 3], counts)
+
+    def test_idle_users_are_swept(self):
+        tracker = MessageRateTracker("test_sweep", window=30, max_messages=5)
+        for user_id in range(1000):
+            tracker.add(user_id)
+        self.now += 20
+        tracker.add(1)
+        self.assertEqual(1000, len(tracker))
+
+        # the next message after a full window triggers the sweep
+        self.now += 15
+        tracker.add(2)
+        self.assertEqual(2, len(tracker))
+        self.assertEqual(1, tracker.count(1))
+        self.assertEqual(0, tracker.count(3))
+        self.assertEqual(2, RATE_TRACKER_USERS_COUNT.labels(tracker="test_sweep")._value.get())
+
+    def test_memory_per_user_is_exported(self):
+        tracker = MessageRateTracker("test_memory", window=30, max_messages=5)
+        self.assertGreater(tracker.bytes_per_user, 0)
+        self.assertEqual(tracker.bytes_per_user, RATE_TRACKER_USER_BYTES.labels(tracker="test_memory")._value.get())
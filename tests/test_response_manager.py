@@ -0,0 +1,139 @@
+#  Copyright (c) 2019 Markus Ressel
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU Affero General Public License as published
+#  by the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU Affero General Public License for more details.
+#
+#  You should have received a copy of the GNU Affero General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import asyncio
+import datetime
+import time
+from types import SimpleNamespace
+from unittest import mock
+
+from prometheus_client import REGISTRY
+
+from deinemudda.const import SETTINGS_TRIGGER_PROBABILITY_KEY
+from deinemudda.persistence.settings import ChatSettings
+from deinemudda.response import ResponseManager
+from tests import TestBase
+
+
+class ResponseManagerTest(TestBase):
+    config = SimpleNamespace(
+        CHAR_COUNT_RANGE=SimpleNamespace(value=range(3, 256)),
+        WORD_COUNT_RANGE=SimpleNamespace(value=range(1, 11)),
+        RULE_ORDER_INTERVAL=SimpleNamespace(value=datetime.timedelta(minutes=10)),
+        NLP_CACHE_SIZE=SimpleNamespace(value=100),
+        NLP_CACHE_TTL=SimpleNamespace(value=datetime.timedelta(hours=1)),
+        NLP_WORKER_TYPE=SimpleNamespace(value="thread"),
+        NLP_WORKERS=SimpleNamespace(value=1),
+        NLP_QUEUE_SIZE=SimpleNamespace(value=1),
+        NLP_TIMEOUT=SimpleNamespace(value=datetime.timedelta(seconds=10)),
+        NLP_BATCH_WINDOW=SimpleNamespace(value=datetime.timedelta(milliseconds=10)),
+        NLP_BATCH_SIZE=SimpleNamespace(value=4),
+    )
+
+    def setUp(self):
+        self.persistence = mock.AsyncMock()
+        self.response_manager = ResponseManager(self.config, self.persistence)
+
+    def tearDown(self):
+        self.response_manager.shutdown()
+
+    def _set_trigger_chance(self, trigger_chance: str):
+        settings = ChatSettings({SETTINGS_TRIGGER_PROBABILITY_KEY: trigger_chance})
+        self.persistence.get_chat_settings.return_value = settings
+        self.persistence.sample_member_name.return_value = self.dummy_member_name
+
+    def test_message_outside_size_range_does_not_touch_persistence(self):
+        self._set_trigger_chance("1")
+
+        for message in ["a", "wen " * 11, "wen" * 100]:
+            response = asyncio.run(self.response_manager.process_message(1, "markus", message))
+            self.assertIsNone(response)
+
+        self.persistence.get_chat_settings.assert_not_called()
+        self.persistence.sample_member_name.assert_not_called()
+
+    def test_trigger_chance_of_unknown_chat(self):
+        self.persistence.get_chat_settings.return_value = None
+
+        # above the default trigger chance
+        with mock.patch("deinemudda.response.random", return_value=0.5):
+            response = asyncio.run(self.response_manager.process_message(1, "markus", "wen?"))
+
+        self.assertIsNone(response)
+        self.persistence.get_chat_settings.assert_called_once_with(1)
+
+    def test_warm_up(self):
+        self.response_manager.warm_up()
+
+        for response_rule in self.response_manager.response_rules:
+            if response_rule.__pattern__ is not None:
+                self.assertIn("compiled_pattern", response_rule.__dict__)
+
+    def test_member_name_is_only_sampled_if_used(self):
+        self._set_trigger_chance("1")
+
+        response = asyncio.run(self.response_manager.process_message(1, "markus", "Warum?"))
+        self.assertEqual("sex", response)
+        self.persistence.sample_member_name.assert_not_called()
+
+        with mock.patch("deinemudda.response.rule.deinemudda.randint", return_value=3):
+            response = asyncio.run(self.response_manager.process_message(1, "max", "Wem?"))
+        self.assertEqual(f"{self.dummy_member_name}'s mudda", response)
+        self.persistence.sample_member_name.assert_called_once_with(1)
+
+    def test_rule_metrics(self):
+        def sample(name: str) -> float:
+            return REGISTRY.get_sample_value(name, {"rule": "WhyRule"}) or 0
+
+        self._set_trigger_chance("1")
+        before = list(map(sample, ["rule_attempts_total", "rule_hits_total", "rule_response_seconds_count"]))
+
+        asyncio.run(self.response_manager.process_message(1, "markus", "Warum?"))
+
+        after = list(map(sample, ["rule_attempts_total", "rule_hits_total", "rule_response_seconds_count"]))
+        self.assertEqual(list(map(lambda x: x + 1, before)), after)
+
+    def test_pattern_search_is_timed(self):
+        def sample(name: str) -> float:
+            return REGISTRY.get_sample_value(name, {"rule": "WhyRule"}) or 0
+
+        self._set_trigger_chance("1")
+        names = ["rule_attempts_total", "rule_match_seconds_count", "rule_hits_total"]
+        before = list(map(sample, names))
+
+        # the token is in the message, but the pattern does not match
+        asyncio.run(self.response_manager.process_message(1, "markus", "darum,warum"))
+
+        after = list(map(sample, names))
+        self.assertEqual([before[0] + 1, before[1] + 1, before[2]], after)
+
+    def test_rule_cpu_time_excludes_database_access(self):
+        self._set_trigger_chance("1")
+
+        async def busy_sample_member_name(chat_id: int) -> str:
+            # other tasks keep the event loop busy while waiting for the database
+            start = time.thread_time()
+            while time.thread_time() - start < 0.1:
+                pass
+            return self.dummy_member_name
+
+        self.persistence.sample_member_name.side_effect = busy_sample_member_name
+        with mock.patch("deinemudda.response.rule.deinemudda.randint", return_value=3):
+            response = asyncio.run(self.response_manager.process_message(1, "max", "Wem?"))
+        self.assertEqual(f"{self.dummy_member_name}'s mudda", response)
+
+        rule_order = self.response_manager.rule_order
+        stats = next(filter(lambda x: x.hits > 0, map(rule_order.get_stats, rule_order.rules)))
+        self.assertLess(stats.mean_cpu_time, 0.05)
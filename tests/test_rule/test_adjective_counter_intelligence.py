@@ -13,6 +13,9 @@
 #  You should have received a copy of the GNU Affero General Public License
 #  along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
+import asyncio
+
+from deinemudda.response.nlp import find_adjp
 from deinemudda.response.rule.deinemudda import AdjectiveCounterIntelligenceRule
 from tests import TestBase
 
@@ -20,8 +23,6 @@ from tests import TestBase
 class AdjectiveCounterIntelligenceRuleTest(TestBase):
 
     def test_samples(self):
-        rule = AdjectiveCounterIntelligenceRule()
-
         mapping = {
             "das ist doch gut geworden": ["doch", "gut"],
             "das ist doch sehr gut": ["doch", "sehr", "gut"],
@@ -32,13 +33,13 @@ class AdjectiveCounterIntelligenceRuleTest(TestBase):
         }
 
         for input, expected_output in mapping.items():
-            output = rule._find_adpj(input)
+            output = find_adjp(input)
             self.assertEqual(expected_output, output)
 
     def test_multiple_words_1(self):
         rule = AdjectiveCounterIntelligenceRule()
 
-        response = rule.get_response(self.dummy_chat, None, "das ist doch gut geworden")
+        response = asyncio.run(rule.get_response(self.sample_dummy_member_name, None, "das ist doch gut geworden"))
         self.assertIn(response, [
             "deine mudda is' doch gut",
             "markus's mudda is' doch gut",
@@ -48,7 +49,8 @@ class AdjectiveCounterIntelligenceRuleTest(TestBase):
     def test_multiple_words(self):
         rule = AdjectiveCounterIntelligenceRule()
 
-        response = rule.get_response(self.dummy_chat, None, "Ihr seid hässlich, dumm und doof")
+        response = asyncio.run(
+            rule.get_response(self.sample_dummy_member_name, None, "Ihr seid hässlich, dumm und doof"))
         self.assertIn(response, [
             "deine mudda is' hässlich , dumm und doof",
             "markus's mudda is' hässlich , dumm und doof",
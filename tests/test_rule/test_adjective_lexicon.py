@@ -0,0 +1,38 @@
+#  Copyright (c) 2019 Markus Ressel
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU Affero General Public License as published
+#  by the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU Affero General Public License for more details.
+#
+#  You should have received a copy of the GNU Affero General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from deinemudda.response.lexicon import AdjectiveLexicon, ADJECTIVE_STOP_WORDS
+from deinemudda.response.nlp import find_adjp
+from tests import TestBase
+from tests.test_rule import RuleTest
+from tests.test_rule.test_negative_examples import NegativeExamplesTest
+
+
+class AdjectiveLexiconTest(TestBase):
+    lexicon = AdjectiveLexicon()
+
+    def test_adjectives(self):
+        for message in ["der bot ist schlau", "Du bist sehr schön", "Geil!", "Ihr seid hässlich, dumm und doof"]:
+            self.assertTrue(self.lexicon.may_match(message), message)
+
+    def test_no_adjectives(self):
+        for message in ["lol", "wer kommt heute mit?", "Tut mir leid", "der selbe"]:
+            self.assertFalse(self.lexicon.may_match(message), message)
+
+    def test_agrees_with_parser(self):
+        for message in RuleTest.real_examples + NegativeExamplesTest.real_examples:
+            if not self.lexicon.may_match(message):
+                constituents = find_adjp(message)
+                self.assertTrue(len(constituents) <= 0 or constituents[-1].lower() in ADJECTIVE_STOP_WORDS, message)
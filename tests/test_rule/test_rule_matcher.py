@@ -0,0 +1,100 @@
+#  Copyright (c) 2019 Markus Ressel
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU Affero General Public License as published
+#  by the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU Affero General Public License for more details.
+#
+#  You should have received a copy of the GNU Affero General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from deinemudda.response.matcher import RuleMatcher
+from deinemudda.response.rule import ResponseRule
+from tests import TestBase
+
+
+class RuleMatcherTest(TestBase):
+    samples = [
+        "Wen?",
+        "Und wessen genau?",
+        "weſſen auto?",
+        "Wem gebe ich das?",
+        "Irgendwer da?",
+        "İrgendwer da?",
+        "who is there?",
+        "Warum das denn?",
+        "deine mudda",
+        "deine mudda, wen interessierts?",
+        "das ist geil",
+        "du KACKNASE",
+        "du superkacknase",
+        "somewho?",
+        "wer wohnt in ner ananas ganz tief im meer",
+        "wer hats erfunden",
+        "who ya gonna call",
+        "Einkauf ist auf morgen früh verlegt",
+        "zeile eins\nwen?",
+        "lol",
+    ]
+
+    def test_matching_rules_are_candidates(self):
+        matcher = RuleMatcher(self.all_rules)
+        pattern_rules = list(filter(lambda x: x.__pattern__ is not None, self.all_rules))
+
+        for sample in self.samples:
+            candidates = matcher.find_candidates(sample)
+            for rule in filter(lambda x: x.matches(sample), pattern_rules):
+                self.assertIn(rule, candidates, f"{rule.__id__}: {sample}")
+
+    def test_rules_without_pattern_are_always_candidates(self):
+        matcher = RuleMatcher(self.all_rules)
+        other_rules = list(filter(lambda x: x.__pattern__ is None, self.all_rules))
+        self.assertTrue(len(other_rules) > 0)
+
+        for sample in self.samples:
+            candidates = matcher.find_candidates(sample)
+            for rule in other_rules:
+                self.assertIn(rule, candidates)
+
+    def test_message_without_tokens_only_yields_untokenized_rules(self):
+        matcher = RuleMatcher(self.all_rules)
+        untokenized_rules = set(filter(lambda x: len(x.__tokens__) <= 0, self.all_rules))
+
+        self.assertEqual(untokenized_rules, matcher.find_candidates("Einkauf ist auf morgen früh verlegt"))
+
+    def test_tokens_match_word_prefixes(self):
+        from deinemudda.response.rule.deinemudda import WhoGermanRule, CustomWordNounRule
+        matcher = RuleMatcher(self.all_rules)
+
+        german_rule = next(filter(lambda x: isinstance(x, WhoGermanRule), self.all_rules))
+        noun_rule = next(filter(lambda x: isinstance(x, CustomWordNounRule), self.all_rules))
+        self.assertIn(german_rule, matcher.find_candidates("Irgendjemand hier?"))
+        self.assertIn(noun_rule, matcher.find_candidates("ihr kacknasen"))
+
+    def test_untokenized_rules_match_within_words(self):
+        from deinemudda.response.rule.deinemudda import WhoEnglishRule, CustomWordNounRule
+        matcher = RuleMatcher(self.all_rules)
+
+        english_rule = next(filter(lambda x: isinstance(x, WhoEnglishRule), self.all_rules))
+        noun_rule = next(filter(lambda x: isinstance(x, CustomWordNounRule), self.all_rules))
+        self.assertIn(english_rule, matcher.find_candidates("somewho?"))
+        self.assertIn(noun_rule, matcher.find_candidates("du superkacknase"))
+
+    def test_tokens_that_are_prefixes_of_other_tokens(self):
+        class ShortTokenRule(ResponseRule):
+            __tokens__ = ("wer",)
+
+        class LongTokenRule(ResponseRule):
+            __tokens__ = ("werbung",)
+
+        short_rule, long_rule = ShortTokenRule(), LongTokenRule()
+        matcher = RuleMatcher([short_rule, long_rule])
+
+        self.assertEqual({short_rule, long_rule}, matcher.find_candidates("Werbungskosten"))
+        self.assertEqual({short_rule}, matcher.find_candidates("werwolf"))
+        self.assertEqual(set(), matcher.find_candidates("bewerbung"))
@@ -0,0 +1,67 @@
+#  Copyright (c) 2019 Markus Ressel
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU Affero General Public License as published
+#  by the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU Affero General Public License for more details.
+#
+#  You should have received a copy of the GNU Affero General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import datetime
+
+from deinemudda.response.ordering import RuleOrder
+from tests import TestBase
+
+
+class DummyRule:
+
+    def __init__(self, name: str, priority: float):
+        self.__id__ = name
+        self.__priority__ = priority
+
+
+class RuleOrderTest(TestBase):
+
+    @staticmethod
+    def _rule(name: str, priority: float):
+        return DummyRule(name, priority)
+
+    def test_rules_are_sorted_by_priority(self):
+        low = self._rule("low", 0)
+        high = self._rule("high", 100)
+        order = RuleOrder([low, high], datetime.timedelta(minutes=10))
+
+        self.assertEqual([high, low], order.rules)
+
+    def test_cheap_rules_with_hits_come_first_within_priority(self):
+        expensive = self._rule("expensive", 0)
+        cheap = self._rule("cheap", 0)
+        high = self._rule("high", 100)
+        order = RuleOrder([expensive, cheap, high], datetime.timedelta(0))
+
+        for _ in range(10):
+            order.record(expensive, hit=True, cpu_time=0.01)
+            order.record(cheap, hit=True, cpu_time=0.0001)
+            order.record(high, hit=False, cpu_time=1)
+
+        self.assertEqual([high, cheap, expensive], order.rules)
+        self.assertEqual(10, order.get_stats(cheap).hits)
+        self.assertAlmostEqual(0.01, order.get_stats(expensive).mean_cpu_time)
+
+    def test_rules_are_only_reordered_after_the_interval(self):
+        expensive = self._rule("expensive", 0)
+        cheap = self._rule("cheap", 0)
+        order = RuleOrder([expensive, cheap], datetime.timedelta(minutes=10))
+
+        order.record(expensive, hit=False, cpu_time=1)
+        order.record(cheap, hit=True, cpu_time=0.0001)
+        self.assertEqual([expensive, cheap], order.rules)
+
+        order.reorder()
+        self.assertEqual([cheap, expensive], order.rules)
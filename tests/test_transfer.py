@@ -0,0 +1,76 @@
+#  Copyright (c) 2019 Markus Ressel
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU Affero General Public License as published
+#  by the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU Affero General Public License for more details.
+#
+#  You should have received a copy of the GNU Affero General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import datetime
+import io
+import os
+
+from sqlalchemy import create_engine
+
+from deinemudda.persistence import Persistence, Chat
+from deinemudda.transfer import export_state, import_state, main
+from tests.test_persistence import PersistenceTestBase
+
+
+class TransferTest(PersistenceTestBase):
+
+    def setUp(self):
+        super().setUp()
+        chat = Chat(id=1, type="group")
+        chat.set_setting("key", "value")
+        self.persistence.add_or_update_chat(chat)
+        self.persistence.add_or_update_chat(Chat(id=2, type="private"))
+        for user_id in [3, 4, 5]:
+            self.persistence.add_or_update_chat_member(self.persistence.get_chat(1), self.telegram_user(user_id))
+        self.persistence.add_or_update_chat_member(self.persistence.get_chat(2), self.telegram_user(3))
+        self.persistence.set_user_timeout(4, datetime.datetime(2019, 1, 1, 12, 30))
+        self.persistence.set_user_banned(5, True)
+
+    def test_export_and_import(self):
+        output = io.StringIO()
+        counts = export_state(self.persistence._engine, output, batch_size=2)
+        self.assertEqual(dict(chats=2, users=3, settings=1, association=4), counts)
+
+        url = f"sqlite:///{os.path.join(self._directory.name, 'imported.db')}"
+        engine = create_engine(url)
+        Persistence.migrate(url)
+        counts = import_state(engine, io.StringIO(output.getvalue()), batch_size=2)
+        engine.dispose()
+        self.assertEqual(dict(chats=2, users=3, settings=1, association=4), counts)
+
+        self.config.SQL_PERSISTENCE_URL.value = url
+        imported = Persistence(self.config)
+        try:
+            chat = imported.get_chat(1)
+            self.assertEqual([3, 4, 5], sorted(map(lambda x: x.id, chat.users)))
+            self.assertEqual("value", chat.get_setting("key", default=None))
+            self.assertEqual([3], list(map(lambda x: x.id, imported.get_chat(2).users)))
+            self.assertEqual(datetime.datetime(2019, 1, 1, 12, 30), imported.get_user_state(4).last_timeout)
+            self.assertTrue(imported.get_user_state(5).is_banned)
+        finally:
+            imported.close()
+
+    def test_command_line(self):
+        path = os.path.join(self._directory.name, "state.ndjson")
+        url = f"sqlite:///{os.path.join(self._directory.name, 'imported.db')}"
+        main(["export", path, "--url", self.config.SQL_PERSISTENCE_URL.value])
+        main(["import", path, "--url", url])
+
+        output = io.StringIO()
+        engine = create_engine(url)
+        export_state(engine, output)
+        engine.dispose()
+        with open(path, encoding="utf-8") as exported:
+            self.assertEqual(exported.read(), output.getvalue())
@@ -0,0 +1,200 @@
+#  Copyright (c) 2019 Markus Ressel
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU Affero General Public License as published
+#  by the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU Affero General Public License for more details.
+#
+#  You should have received a copy of the GNU Affero General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import asyncio
+import datetime
+import threading
+import time
+
+from deinemudda.response import nlp
+from deinemudda.stats import WORKER_BATCH_SIZE
+from deinemudda.worker import WorkerPool, WorkerPoolSaturatedError
+from tests import TestBase
+
+
+class WorkerPoolTest(TestBase):
+
+    def test_run(self):
+        pool = WorkerPool("test_run", worker_type="process", workers=1, queue_size=0,
+                          timeout=datetime.timedelta(seconds=10))
+        try:
+            result = asyncio.run(pool.run(max, 1, 2))
+            self.assertEqual(2, result)
+        finally:
+            pool.shutdown()
+
+    def test_saturated_pool_rejects_tasks(self):
+        pool = WorkerPool("test_saturated", worker_type="thread", workers=1, queue_size=1,
+                          timeout=datetime.timedelta(seconds=10))
+        release = threading.Event()
+
+        async def run():
+            blocked = [asyncio.ensure_future(pool.run(release.wait)) for _ in range(2)]
+            await asyncio.sleep(0)
+            with self.assertRaises(WorkerPoolSaturatedError):
+                await pool.run(release.wait)
+            release.set()
+            await asyncio.gather(*blocked)
+            # capacity is available again
+            self.assertTrue(await pool.run(release.wait))
+
+        try:
+            asyncio.run(run())
+        finally:
+            release.set()
+            pool.shutdown()
+
+    def test_timeout(self):
+        pool = WorkerPool("test_timeout", worker_type="thread", workers=1, queue_size=0,
+                          timeout=datetime.timedelta(milliseconds=10))
+        release = threading.Event()
+
+        try:
+            with self.assertRaises(asyncio.TimeoutError):
+                asyncio.run(pool.run(release.wait))
+        finally:
+            release.set()
+            pool.shutdown()
+
+    def test_concurrent_calls_are_batched(self):
+        pool = WorkerPool("test_batched", worker_type="process", workers=1, queue_size=0,
+                          timeout=datetime.timedelta(seconds=10),
+                          batch_window=datetime.timedelta(seconds=10), batch_size=3)
+
+        async def run():
+            # the batch is submitted as soon as it is full, long before the batch window has passed
+            return await asyncio.gather(*[pool.run_batched(abs, x) for x in [-1, -2, -3]])
+
+        try:
+            self.assertEqual([1, 2, 3], asyncio.run(run()))
+        finally:
+            pool.shutdown()
+
+    def test_batch_window(self):
+        pool = WorkerPool("test_batch_window", worker_type="thread", workers=1, queue_size=0,
+                          timeout=datetime.timedelta(seconds=10),
+                          batch_window=datetime.timedelta(milliseconds=10), batch_size=100)
+
+        async def run():
+            return await asyncio.gather(*[pool.run_batched(abs, x) for x in [-1, -2]], return_exceptions=True)
+
+        try:
+            self.assertEqual([1, 2], asyncio.run(run()))
+        finally:
+            pool.shutdown()
+
+    def test_batched_call_returns_cpu_time(self):
+        pool = WorkerPool("test_batch_cpu_time", worker_type="thread", workers=1, queue_size=0,
+                          timeout=datetime.timedelta(seconds=10))
+
+        def spin_and_sleep(seconds: float):
+            start = time.thread_time()
+            while time.thread_time() - start < seconds:
+                pass
+            time.sleep(seconds)
+            return seconds
+
+        try:
+            result, cpu_time = asyncio.run(pool.run_batched_timed(spin_and_sleep, 0.1))
+            self.assertEqual(0.1, result)
+            # the sleep is not part of it
+            self.assertGreaterEqual(cpu_time, 0.1)
+            self.assertLess(cpu_time, 0.15)
+        finally:
+            pool.shutdown()
+
+    def test_call_to_idle_pool_is_not_delayed(self):
+        pool = WorkerPool("test_batch_idle", worker_type="thread", workers=1, queue_size=0,
+                          timeout=datetime.timedelta(seconds=10),
+                          batch_window=datetime.timedelta(seconds=10), batch_size=100)
+
+        async def run():
+            return await asyncio.wait_for(pool.run_batched(abs, -1), 1)
+
+        try:
+            self.assertEqual(1, asyncio.run(run()))
+        finally:
+            pool.shutdown()
+
+    def test_calls_are_batched_while_workers_are_busy(self):
+        pool = WorkerPool("test_batch_busy", worker_type="thread", workers=1, queue_size=1,
+                          timeout=datetime.timedelta(seconds=10),
+                          batch_window=datetime.timedelta(seconds=10), batch_size=100)
+        release = threading.Event()
+
+        def wait_or_abs(x):
+            return release.wait() if x is None else abs(x)
+
+        async def run():
+            busy = asyncio.ensure_future(pool.run_batched(wait_or_abs, None))
+            await asyncio.sleep(0)
+            waiting = asyncio.gather(*[pool.run_batched(wait_or_abs, x) for x in [-1, -2, -3]])
+            await asyncio.sleep(0)
+            release.set()
+            # the collected calls are submitted as soon as the worker is done, not after the batch window
+            return await asyncio.wait_for(asyncio.gather(busy, waiting), 1)
+
+        try:
+            self.assertEqual([True, [1, 2, 3]], asyncio.run(run()))
+            batch_sizes = WORKER_BATCH_SIZE.labels(pool="test_batch_busy")
+            self.assertEqual(2, batch_sizes._count.get())
+            self.assertEqual(4, batch_sizes._sum.get())
+        finally:
+            release.set()
+            pool.shutdown()
+
+    def test_batched_errors_only_affect_their_call(self):
+        pool = WorkerPool("test_batch_errors", worker_type="thread", workers=1, queue_size=0,
+                          timeout=datetime.timedelta(seconds=10),
+                          batch_window=datetime.timedelta(milliseconds=10), batch_size=2)
+
+        async def run():
+            return await asyncio.gather(*[pool.run_batched(abs, x) for x in [-1, "a"]], return_exceptions=True)
+
+        try:
+            result, error = asyncio.run(run())
+            self.assertEqual(1, result)
+            self.assertIsInstance(error, TypeError)
+        finally:
+            pool.shutdown()
+
+    def test_start_initializes_all_workers(self):
+        initialized = []
+
+        def initializer():
+            initialized.append(threading.get_ident())
+            # keep the worker busy, so the next task starts another one
+            release.wait()
+
+        release = threading.Event()
+        pool = WorkerPool("test_start", worker_type="thread", workers=2, queue_size=0,
+                          timeout=datetime.timedelta(seconds=10), initializer=initializer)
+        try:
+            timer = threading.Timer(0.1, release.set)
+            timer.start()
+            pool.start()
+            self.assertEqual(2, len(set(initialized)))
+        finally:
+            release.set()
+            pool.shutdown()
+
+    def test_concurrent_nlp_warm_up(self):
+        pool = WorkerPool("test_nlp_warm_up", worker_type="thread", workers=2, queue_size=0,
+                          timeout=datetime.timedelta(seconds=30), initializer=nlp.warm_up)
+        try:
+            pool.start()
+            self.assertEqual(["schlau"], nlp.find_adjp("der bot ist schlau"))
+        finally:
+            pool.shutdown()